@@ -1,47 +1,501 @@
 import asyncio
 import math
 import json
+import time
+import hashlib
+import os
+import socket
+import httpx
 import openai
+import sqlalchemy.exc
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
 from openai import AsyncOpenAI, types
-from typing import Tuple, List, cast, Optional
-from config import LLM_API_BASE_URL, BACKEND_READY, MODEL_NAME_MAP
-from dataclasses import dataclass
+from typing import Tuple, List, cast, Optional, AsyncIterator, Awaitable, Callable, Generic, TypeVar
+import config
+from config import LLM_API_BASE_URL, BACKEND_READY, LLM_REPLICA_RETRIES, CONTEXT_CACHE_SIZE, BATCH_PROMPTS, LLM_MAX_CONNECTIONS, LLM_KEEPALIVE_EXPIRY, LLM_CLIENT_IDLE_TIMEOUT, EVAL_CACHE, EVAL_CACHE_SIZE, LLM_CONCURRENCY, LLM_CONCURRENCY_MIN, LLM_CONCURRENCY_MAX, LLM_QUEUE_SIZE, LLM_TARGET_LATENCY, CASSETTE_MODE, CASSETTE_PATH, EVAL_LEASE_TTL, EVAL_LEASE_POLL_INTERVAL
+from models import SessionLocal
+from data_access import get_cached_eval, store_cached_eval, acquire_eval_lease, release_eval_lease, eval_lease_held
+from scoring import score_batch
+from cassette import Cassette, CassetteMissError, CASSETTE_MODES, error_response, replayed_error
+from balancer import Replica, ReplicaSet
+from dataclasses import dataclass, field
 
-async def get_loglikelihood_async(
-    client: AsyncOpenAI,
-    question: str,
-    answer: str,
-    model: str,
-) -> Tuple[float, int]:
+K = TypeVar("K")
+V = TypeVar("V")
+
+@dataclass
+class _PooledClient:
+    client: AsyncOpenAI
+    last_used: float
+    active: int = 0
+
+@dataclass
+class ClientPoolStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    open_clients: int = 0
+
+@dataclass
+class ScoringStats:
+    cancelled: int = 0
+    disconnects: int = 0
+    deadlines_exceeded: int = 0
+    coalesced: int = 0 # requests that waited for an identical request being scored in this worker
+    lease_waits: int = 0 # times a request waited for another worker to score the same question
+
+scoring_stats = ScoringStats()
+
+class ClientPool:
     """
-    Return the loglikelihood of a certain answer given the question in an asynchronous way.
+    Long lived AsyncOpenAI clients keyed by (base_url, api_key).
+
+    Each client keeps its own keep-alive connection pool to the inference
+    server, limited to max_connections.  Clients that have not been used for
+    idle_timeout seconds are closed the next time the pool is used.
     """
-    context = f"You are a friendly and helpful AI assistant. Please help me to answer the following question.\n\nQuestion {question}\n\nAnswer:"
-    continuation = f" {answer.strip()}"
-    # Obtain the number of tokens in the context
-    context_echo = await client.completions.create(
+    def __init__(self,
+                 max_connections: int = LLM_MAX_CONNECTIONS,
+                 keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+                 idle_timeout: float = LLM_CLIENT_IDLE_TIMEOUT,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections, keepalive_expiry=keepalive_expiry)
+        self.idle_timeout = idle_timeout
+        self.transport = transport
+        self.stats = ClientPoolStats()
+        self._clients: dict[Tuple[str, str], _PooledClient] = {}
+
+    def _new_client(self, base_url: str, api_key: str) -> AsyncOpenAI:
+        http_client = openai.DefaultAsyncHttpxClient(limits=self.limits, transport=self.transport)
+        return AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=http_client)
+
+    async def evict_idle(self):
+        now = time.monotonic()
+        idle = [key for key, pooled in self._clients.items() if pooled.active == 0 and now - pooled.last_used > self.idle_timeout]
+        for key in idle:
+            pooled = self._clients.pop(key)
+            self.stats.evictions += 1
+            await pooled.client.close()
+        self.stats.open_clients = len(self._clients)
+
+    @asynccontextmanager
+    async def client(self, base_url: str, api_key: str) -> AsyncIterator[AsyncOpenAI]:
+        await self.evict_idle()
+        key = (base_url, api_key)
+        pooled = self._clients.get(key)
+        if pooled is None:
+            self.stats.misses += 1
+            pooled = self._clients[key] = _PooledClient(self._new_client(base_url, api_key), time.monotonic())
+            self.stats.open_clients = len(self._clients)
+        else:
+            self.stats.hits += 1
+        pooled.active += 1
+        try:
+            yield pooled.client
+        finally:
+            pooled.active -= 1
+            pooled.last_used = time.monotonic()
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for pooled in clients.values():
+            await pooled.client.close()
+        self.stats.open_clients = 0
+
+client_pool = ClientPool()
+
+class BackendOverloadedError(Exception):
+    pass
+
+class BackendUnavailableError(Exception):
+    """
+    Every replica of the model failed its recent health probes.
+    """
+
+@dataclass
+class ConcurrencyStats:
+    completed: int = 0
+    backoffs: int = 0
+    rejected: int = 0
+
+class AdaptiveLimiter:
+    """
+    Bounds the number of concurrent completion requests sent to one model replica.
+
+    The limit grows additively while requests finish within target_latency and
+    is cut multiplicatively on slow responses, rate limits, server errors and
+    connection failures (at most once per target_latency so a burst of failures counts as
+    one congestion signal).  Requests over the limit wait in a FIFO queue of at
+    most max_queue entries; beyond that BackendOverloadedError is raised
+    immediately rather than letting the request time out.
+    """
+    def __init__(self,
+                 model: str,
+                 initial: int = LLM_CONCURRENCY,
+                 minimum: int = LLM_CONCURRENCY_MIN,
+                 maximum: int = LLM_CONCURRENCY_MAX,
+                 max_queue: int = LLM_QUEUE_SIZE,
+                 target_latency: float = LLM_TARGET_LATENCY,
+                 backoff: float = 0.5,
+                 base_url: str = LLM_API_BASE_URL):
+        self.model = model
+        self.base_url = base_url
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_queue = max_queue
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.in_flight = 0
+        self.stats = ConcurrencyStats()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_backoff = -math.inf
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # the slot is handed over to the waiter
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _increase(self):
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._wake()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_backoff < self.target_latency:
+            return
+        self._last_backoff = now
+        self.stats.backoffs += 1
+        self.limit = max(self.minimum, self.limit * self.backoff)
+
+    async def _acquire(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.stats.rejected += 1
+            raise BackendOverloadedError(f"{self.model} is overloaded: {self.in_flight} requests running and {len(self._waiters)} queued")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # handed a slot that will not be used
+                self.in_flight -= 1
+                self._wake()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self._acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError):
+            self._decrease()
+            raise
+        else:
+            self.stats.completed += 1
+            if time.monotonic() - start > self.target_latency:
+                self._decrease()
+            else:
+                self._increase()
+        finally:
+            self.in_flight -= 1
+            self._wake()
+
+concurrency_limits: dict[Tuple[str, str], AdaptiveLimiter] = {}
+
+def limiter_for(model: str, base_url: str) -> AdaptiveLimiter:
+    limiter = concurrency_limits.get((model, base_url))
+    if limiter is None:
+        limiter = concurrency_limits[(model, base_url)] = AdaptiveLimiter(model, base_url=base_url)
+    return limiter
+
+# replicas of each served model name
+replica_sets: dict[str, ReplicaSet] = {}
+
+def served_base_urls(model: str) -> list[str]:
+    base_urls = list(dict.fromkeys(url for name, served in config.MODEL_NAME_MAP.items() if served == model for url in config.MODEL_BASE_URLS[name]))
+    return base_urls or [config.LLM_API_BASE_URL]
+
+def replicas_for(model: str) -> ReplicaSet:
+    replicas = replica_sets.get(model)
+    if replicas is None:
+        replicas = replica_sets[model] = ReplicaSet(model, served_base_urls(model))
+    return replicas
+
+def update_replicas():
+    """
+    Bring the replica sets and concurrency limits in line with a reloaded model map.
+
+    Replicas and limiters of base URLs that are still in use are kept with
+    their health and limits, so are the pooled clients connected to them.
+    Requests already running on a removed replica finish there, and the sets
+    of models no longer in the map are left alone for requests that started
+    before it changed.
+    """
+    served = set(config.MODEL_NAME_MAP.values())
+    for model, replicas in list(replica_sets.items()):
+        if model in served:
+            replicas.update(served_base_urls(model))
+    for model, base_url in list(concurrency_limits):
+        if model in served and model in replica_sets and all(r.base_url != base_url for r in replica_sets[model].replicas):
+            del concurrency_limits[(model, base_url)]
+
+@dataclass
+class LLMClient:
+    """
+    Completion requests made with one caller's API key, each routed to a replica of its model.
+    """
+    api_key: str
+
+if CASSETTE_MODE not in CASSETTE_MODES:
+    raise ValueError(f"QUESTIONSUI_CASSETTE_MODE must be one of {', '.join(CASSETTE_MODES)}")
+cassette: Optional[Cassette] = Cassette(CASSETTE_PATH) if CASSETTE_MODE != "off" else None
+
+async def create_completion(client: LLMClient, model: str, prompt: str|List[str]) -> types.Completion:
+    """
+    Echo the prompt through the model to obtain the logprobs of its tokens.
+
+    Depending on CASSETTE_MODE the response is served from and/or saved to the cassette.
+    The request goes to the replica of the model with the fewest outstanding
+    requests; connection failures, timeouts, server errors and rate limits are
+    retried on up to LLM_REPLICA_RETRIES other replicas.  When the health
+    probes found every replica down BackendUnavailableError is raised at once.
+    """
+    request = dict(
         model=model,
-        prompt=context,
+        prompt=prompt,
         echo=True,
         max_tokens=0,
         temperature=0.0,
         logprobs=1,
     )
-    context_num_tokens = len(cast(list[float], cast(types.completion_choice.Logprobs, context_echo.choices[0].logprobs).token_logprobs))
+    if cassette is not None and CASSETTE_MODE in ("replay", "readthrough"):
+        if (saved := cassette.get(request)) is not None:
+            status, response = saved
+            if status != 200:
+                raise replayed_error(status, response)
+            # construct like the client does, vLLM returns a null logprob for the first token
+            return types.Completion.construct(**json.loads(response))
+        if CASSETTE_MODE == "replay":
+            raise CassetteMissError(f"no recorded completion of {model} for this prompt in {cassette.path}")
+    replicas = replicas_for(model)
+    if not replicas.available():
+        errors = "; ".join(f"{r.base_url}: {r.probe.error}" for r in replicas.replicas if r.probe is not None)
+        raise BackendUnavailableError(f"{model} is down ({errors})")
+    tried: set[str] = set()
+    while True:
+        replica = cast(Replica, replicas.pick(tried))
+        replica.outstanding += 1
+        try:
+            async with client_pool.client(replica.base_url, client.api_key) as llm_client:
+                if len(replicas.replicas) > 1:
+                    # fail over to another replica rather than retry this one
+                    llm_client = llm_client.with_options(max_retries=0)
+                async with limiter_for(model, replica.base_url).slot():
+                    completion = await llm_client.completions.create(**request)
+        except (openai.APIConnectionError, openai.InternalServerError, openai.RateLimitError) as e:
+            if not isinstance(e, openai.RateLimitError):
+                # a busy replica is not an unhealthy one
+                replicas.failure(replica)
+            tried.add(replica.base_url)
+            if len(tried) > LLM_REPLICA_RETRIES or replicas.pick(tried) is None:
+                raise
+        except (openai.BadRequestError, openai.UnprocessableEntityError) as e:
+            # a rejection of the request itself, e.g. a list prompt or a question
+            # longer than the context window, is replayed like a response
+            if cassette is not None:
+                await cassette.put(request, error_response(e), e.status_code)
+            raise
+        else:
+            replicas.success(replica)
+            break
+        finally:
+            replica.outstanding -= 1
+    if cassette is not None:
+        await cassette.put(request, completion.model_dump_json())
+    return completion
+
+def build_context(question: str) -> str:
+    return f"You are a friendly and helpful AI assistant. Please help me to answer the following question.\n\nQuestion {question}\n\nAnswer:"
+
+class LRUCache(Generic[K, V]):
+    """
+    A bounded in-memory mapping that evicts the least recently used entry.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[K, V] = OrderedDict()
+
+    def get(self, key: K) -> Optional[V]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# The context only depends on the question, so its token count is shared by the
+# correct answer and every distractor, and across requests testing the same question.
+context_length_cache: LRUCache[Tuple[str, str], int] = LRUCache(CONTEXT_CACHE_SIZE)
+# models whose server rejected a list of prompts in a single completions request
+list_prompts_unsupported: set[str] = set()
+
+async def get_context_num_tokens_async(
+    client: LLMClient,
+    context: str,
+    model: str,
+) -> int:
+    """
+    Return the number of tokens in the context, asking the model only on a cache miss.
+    """
+    context_num_tokens = context_length_cache.get((model, context))
+    if context_num_tokens is None:
+        context_echo = await create_completion(client, model, context)
+        context_num_tokens = len(cast(list[float], cast(types.completion_choice.Logprobs, context_echo.choices[0].logprobs).token_logprobs))
+        context_length_cache.put((model, context), context_num_tokens)
+    return context_num_tokens
+
+async def get_answer_logprobs_async(
+    client: LLMClient,
+    question: str,
+    answer: str,
+    model: str,
+) -> list[Optional[float]]:
+    """
+    Return the logprob of every token of a certain answer given the question in an asynchronous way.
+    """
+    context = build_context(question)
+    continuation = f" {answer.strip()}"
+    # Obtain the number of tokens in the context
+    context_num_tokens = await get_context_num_tokens_async(client, context, model)
     # Get the completion for the whole query
-    completion = await client.completions.create(
-        model=model,
-        prompt=context + continuation,
-        echo=True,
-        max_tokens=0,
-        temperature=0.0,
-        logprobs=1,
-    )
+    completion = await create_completion(client, model, context + continuation)
     token_logprobs = cast(list[Optional[float]], cast(types.completion_choice.Logprobs, completion.choices[0].logprobs).token_logprobs)
+    return token_logprobs[context_num_tokens:]
+
+async def get_loglikelihood_async(
+    client: LLMClient,
+    question: str,
+    answer: str,
+    model: str,
+) -> Tuple[float, int]:
+    """
+    Return the loglikelihood of a certain answer given the question in an asynchronous way.
+    """
+    return continuation_loglikelihood(await get_answer_logprobs_async(client, question, answer, model))
+
+def continuation_loglikelihood(token_logprobs: list[Optional[float]], context_num_tokens: int = 0) -> Tuple[float, int]:
+    """
+    Return the mean loglikelihood and the number of tokens of the continuation after the context.
+    """
     sequence: list[float] = [i for i in token_logprobs[context_num_tokens:] if i is not None]
     loglikelihood = sum(sequence)/len(sequence)
     return loglikelihood, len(token_logprobs[context_num_tokens:])
 
+async def get_answers_logprobs_batched_async(
+    client: LLMClient,
+    question: str,
+    answers: List[str],
+    model: str,
+) -> List[list[Optional[float]]]:
+    """
+    Return the token logprobs of each answer given the question using a single completions request.
+
+    The prompt list holds the context (unless its length is already cached)
+    followed by the context plus each answer; the choices are matched back to
+    the prompts by their index.
+    """
+    context = build_context(question)
+    context_num_tokens = context_length_cache.get((model, context))
+    prompts = [context + f" {answer.strip()}" for answer in answers]
+    if context_num_tokens is None:
+        prompts.insert(0, context)
+    completion = await create_completion(client, model, prompts)
+    choices = sorted(completion.choices, key=lambda c: c.index)
+    token_logprobs = [cast(list[Optional[float]], cast(types.completion_choice.Logprobs, c.logprobs).token_logprobs) for c in choices]
+    if len(token_logprobs) != len(prompts):
+        raise ValueError(f"{model} returned {len(token_logprobs)} choices for {len(prompts)} prompts")
+    if context_num_tokens is None:
+        context_num_tokens = len(token_logprobs.pop(0))
+        context_length_cache.put((model, context), context_num_tokens)
+    return [t[context_num_tokens:] for t in token_logprobs]
+
+async def get_answers_logprobs_async(
+    client: LLMClient,
+    question: str,
+    answers: List[str],
+    model: str,
+) -> List[list[Optional[float]]]:
+    """
+    Return the token logprobs of each answer given the question.
+
+    Answers are scored in one batched request when the server accepts list
+    prompts, otherwise one request per answer is made.  Servers that reject
+    list prompts are remembered so later questions go straight to the
+    per-answer path.
+    """
+    if BATCH_PROMPTS and model not in list_prompts_unsupported:
+        try:
+            return await get_answers_logprobs_batched_async(client, question, answers, model)
+        except openai.BadRequestError:
+            # fall through to the per-answer path, if that succeeds the
+            # server rejected the list prompt rather than the question
+            batch_rejected = True
+    else:
+        batch_rejected = False
+    first = await get_answer_logprobs_async(client, question, answers[0], model)
+    rest = await asyncio.gather(
+        *[get_answer_logprobs_async(client, question, answer, model) for answer in answers[1:]]
+    )
+    if batch_rejected:
+        list_prompts_unsupported.add(model)
+    return [first, *rest]
+
+async def get_loglikelihoods_async(
+    client: LLMClient,
+    question: str,
+    answers: List[str],
+    model: str,
+) -> List[Tuple[float, int]]:
+    """
+    Return the mean loglikelihood and token count of each answer given the question.
+    """
+    return [continuation_loglikelihood(t) for t in await get_answers_logprobs_async(client, question, answers, model)]
+
 @dataclass
 class eval_result:
     is_correct: bool
@@ -49,33 +503,272 @@ class eval_result:
     correct_log_str: str
     incorrect_log_str: str
     model: str
+    # continuation token logprobs of the correct answer and then each
+    # distractor, only filled in when requested with with_logprobs
+    answer_logprobs: List[list[Optional[float]]] = field(default_factory=list)
+
+# Bump when build_context or the scoring in test_question_impl changes so that
+# previously cached results are no longer used.
+PROMPT_TEMPLATE_VERSION = 2
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+def eval_cache_key(model: str, served_model: str, question: str, correct_answer: str, incorrect_answers: List[str]) -> str:
+    """
+    Content address of an evaluation.
+
+    The mapped model name is part of the key, so pointing a model at a
+    different checkpoint in MODEL_NAME_MAP invalidates its cached results.
+    """
+    payload = json.dumps([
+        PROMPT_TEMPLATE_VERSION,
+        model,
+        served_model,
+        normalize_text(question),
+        normalize_text(correct_answer),
+        sorted(normalize_text(a) for a in incorrect_answers),
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+@dataclass
+class _CachedEval:
+    is_correct: bool
+    score: float
+    correct_log_str: str
+    incorrect_logs: List[str] # ordered by the normalized distractor text
+
+eval_result_cache: LRUCache[str, _CachedEval] = LRUCache(EVAL_CACHE_SIZE)
+
+def _distractor_order(incorrect_answers: List[str]) -> List[int]:
+    return sorted(range(len(incorrect_answers)), key=lambda i: normalize_text(incorrect_answers[i]))
+
+def _split_logs(logs: str) -> List[str]:
+    # a question without distractors has no logs, not one empty log
+    return [] if logs == "" else logs.split(",")
+
+def _load_cached_eval(key: str) -> Optional[_CachedEval]:
+    with SessionLocal() as db:
+        row = get_cached_eval(db, key)
+        if row is None:
+            return None
+        return _CachedEval(row.is_correct, row.score, row.correct_log_str, _split_logs(row.incorrect_log_str))
+
+def _store_cached_eval(key: str, model: str, cached: _CachedEval):
+    with SessionLocal() as db:
+        store_cached_eval(db, key, model, cached.is_correct, cached.score, cached.correct_log_str, ",".join(cached.incorrect_logs))
+
+def _from_cached(cached: _CachedEval, served_model: str, incorrect_answers: List[str]) -> eval_result:
+    incorrect_logs = [""] * len(incorrect_answers)
+    for log, i in zip(cached.incorrect_logs, _distractor_order(incorrect_answers)):
+        incorrect_logs[i] = log
+    return eval_result(cached.is_correct, cached.score, cached.correct_log_str, ",".join(incorrect_logs), served_model)
+
+def _to_cached(result: eval_result, incorrect_answers: List[str]) -> _CachedEval:
+    incorrect_logs = _split_logs(result.incorrect_log_str)
+    return _CachedEval(result.is_correct, result.score, result.correct_log_str, [incorrect_logs[i] for i in _distractor_order(incorrect_answers)])
+
+async def get_cached_eval_result(key: str, served_model: str, incorrect_answers: List[str]) -> Optional[eval_result]:
+    """
+    Look up a previous evaluation in memory and then in the database shared by all workers.
+    """
+    cached = eval_result_cache.get(key)
+    if cached is None:
+        try:
+            cached = await asyncio.to_thread(_load_cached_eval, key)
+        except sqlalchemy.exc.OperationalError:
+            # the database is busy, score the question instead of waiting
+            return None
+        if cached is None or len(cached.incorrect_logs) != len(incorrect_answers):
+            return None
+        eval_result_cache.put(key, cached)
+    return _from_cached(cached, served_model, incorrect_answers)
+
+async def _put_cached_eval(key: str, model: str, cached: _CachedEval):
+    eval_result_cache.put(key, cached)
+    try:
+        await asyncio.to_thread(_store_cached_eval, key, model, cached)
+    except sqlalchemy.exc.OperationalError:
+        # the database is busy; the result is still cached in this worker and
+        # failing to share it is no reason to fail the request
+        pass
+
+async def put_cached_eval_result(key: str, model: str, incorrect_answers: List[str], result: eval_result):
+    await _put_cached_eval(key, model, _to_cached(result, incorrect_answers))
+
+@dataclass
+class _Flight(Generic[V]):
+    task: asyncio.Task[V]
+    waiters: int = 0
+
+class SingleFlight(Generic[K, V]):
+    """
+    Run one call per key at a time, callers with the same key while it runs share its result.
+
+    The call runs in its own task, so a caller that is cancelled (its client
+    went away) leaves it running for the others; it is cancelled only once
+    every caller has gone.  Only the caller that started a call gets its
+    errors of the types in own_errors, the callers that joined it make their
+    own call instead.
+    """
+    def __init__(self):
+        self._flights: dict[K, _Flight[V]] = {}
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._flights
+
+    def _done(self, key: K, flight: _Flight[V]):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do(self, key: K, call: Callable[[], Awaitable[V]], own_errors: tuple[type[BaseException], ...] = ()) -> V:
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.create_task(call()))
+            flight.task.add_done_callback(lambda _: self._done(key, flight))
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except own_errors:
+            if not joined:
+                raise
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+        return await call()
+
+# evaluations being scored in this worker by eval_cache_key
+eval_flights: SingleFlight[str, Optional[_CachedEval]] = SingleFlight()
+# identifies this worker in eval_lease
+lease_owner = f"{socket.gethostname()}:{os.getpid()}"
+
+def _acquire_eval_lease(key: str) -> bool:
+    with SessionLocal() as db:
+        return acquire_eval_lease(db, key, lease_owner, EVAL_LEASE_TTL)
+
+def _release_eval_lease(key: str):
+    with SessionLocal() as db:
+        release_eval_lease(db, key, lease_owner)
+
+def _poll_eval(key: str) -> Tuple[Optional[_CachedEval], bool]:
+    with SessionLocal() as db:
+        leased = eval_lease_held(db, key)
+    return _load_cached_eval(key), leased
+
+async def _lease(key: str) -> bool:
+    try:
+        return await asyncio.to_thread(_acquire_eval_lease, key)
+    except sqlalchemy.exc.OperationalError:
+        # better to score twice than to wait on a busy database
+        return True
+
+async def _wait_for_other_worker(key: str) -> Optional[_CachedEval]:
+    """
+    Wait for the worker holding the lease on key to store its result, None if it gave up the lease without one.
+    """
+    while True:
+        await asyncio.sleep(EVAL_LEASE_POLL_INTERVAL)
+        try:
+            cached, leased = await asyncio.to_thread(_poll_eval, key)
+        except sqlalchemy.exc.OperationalError:
+            continue
+        if cached is not None or not leased:
+            return cached
+
+async def _score_question(
+        model: str,
+        question: str,
+        correct_answer: str,
+        incorrect_answers: List[str],
+        api_key: str,
+        with_logprobs: bool,
+        ) -> eval_result:
+    try:
+        answer_logprobs = await get_answers_logprobs_async(LLMClient(api_key), question, [correct_answer, *incorrect_answers], model)
+        (correct_loglikelihood, correct_token_count), *incorrect_responses = [continuation_loglikelihood(t) for t in answer_logprobs]
+        incorrect_loglikelihoods, incorrect_token_counts = [r[0] for r in incorrect_responses], [r[1] for r in incorrect_responses]
+        scores, is_correct = score_batch([[correct_loglikelihood, *incorrect_loglikelihoods]], [[correct_token_count, *incorrect_token_counts]], "token_normalized")
+        answer_correctly, score = bool(is_correct[0]), float(scores[0])
+        correct_log_str = f'{correct_loglikelihood:.2f}'
+        incorrect_logs_str = ",".join([f'{loglikelihood:.2f}' for loglikelihood in incorrect_loglikelihoods])
+
+        return eval_result(answer_correctly, score, correct_log_str, incorrect_logs_str, model, answer_logprobs if with_logprobs else [])
+    except openai.APITimeoutError:
+        raise TimeoutError(f"{model} timed out")
+    except openai.BadRequestError:
+        return eval_result(False, 0.0, "", "", model)
+    except asyncio.CancelledError:
+        # the client went away or the deadline passed, the in-flight
+        # completion requests are closed as the cancellation unwinds
+        scoring_stats.cancelled += 1
+        raise
+
+async def _score_shared(key: str, model: str, served_model: str, question: str, correct_answer: str, incorrect_answers: List[str], api_key: str) -> Optional[_CachedEval]:
+    """
+    Score a question once across workers: the worker holding the lease in eval_lease scores it and the others wait for its result in eval_cache.
+    """
+    if EVAL_CACHE:
+        while not await _lease(key):
+            scoring_stats.lease_waits += 1
+            if (cached := await _wait_for_other_worker(key)) is not None:
+                eval_result_cache.put(key, cached)
+                return cached
+    try:
+        result = await _score_question(served_model, question, correct_answer, incorrect_answers, api_key, with_logprobs=False)
+        if result.correct_log_str == "":
+            return None
+        cached = _to_cached(result, incorrect_answers)
+        if EVAL_CACHE:
+            await _put_cached_eval(key, model, cached)
+        return cached
+    finally:
+        if EVAL_CACHE:
+            try:
+                await asyncio.to_thread(_release_eval_lease, key)
+            except sqlalchemy.exc.OperationalError:
+                # the lease expires by itself
+                pass
 
 async def test_question_impl(
         model: str,
         question: str,
         correct_answer: str,
         incorrect_answers: List[str],
-        api_key: str
+        api_key: str,
+        with_logprobs: bool = False,
+        served_model: Optional[str] = None,
         ) -> eval_result:
+    """
+    Score a question with a model, served as served_model or as it is named in MODEL_NAME_MAP.
+
+    Identical requests that arrive while the question is being scored, in
+    this worker or another, wait for that result instead of querying the
+    model again.  with_logprobs returns the token logprobs of every answer
+    for storage; the eval cache does not hold them, so such requests always
+    query the model.
+    """
     if BACKEND_READY:
-        try:
-            model = MODEL_NAME_MAP[model]
-            ASYNC_LLM_CLIENT = AsyncOpenAI(base_url=LLM_API_BASE_URL, api_key=api_key)
-            correct_loglikelihood, correct_token_count = await get_loglikelihood_async(ASYNC_LLM_CLIENT, question, correct_answer, model)
-            incorrect_responses = await asyncio.gather(
-                *[get_loglikelihood_async(ASYNC_LLM_CLIENT, question, incorrect_answer, model) for incorrect_answer in incorrect_answers]
-            )
-            incorrect_loglikelihoods, incorrect_token_counts = [r[0] for r in incorrect_responses], [r[1] for r in incorrect_responses]
-            avg_token_count = (correct_token_count + sum(incorrect_token_counts)) / (len(incorrect_token_counts) + 1)
-            answer_correctly = correct_loglikelihood > max(incorrect_loglikelihoods)
-            score = math.exp(correct_loglikelihood*avg_token_count) / (sum([math.exp(loglikelihood*avg_token_count) for loglikelihood in incorrect_loglikelihoods]) + math.exp(correct_loglikelihood*avg_token_count))
-            correct_log_str = f'{correct_loglikelihood:.2f}'
-            incorrect_logs_str = ",".join([f'{loglikelihood:.2f}' for loglikelihood in incorrect_loglikelihoods])
-
-            return eval_result(answer_correctly, score, correct_log_str, incorrect_logs_str, model)
-        except openai.APITimeoutError:
-            raise TimeoutError(f"{model} timed out")
-        except openai.BadRequestError:
-            pass
+        if served_model is None:
+            # resolved once, a request finishes with the model it started with even if the model map is reloaded
+            served_model = config.MODEL_NAME_MAP[model]
+        if with_logprobs:
+            result = await _score_question(served_model, question, correct_answer, incorrect_answers, api_key, with_logprobs=True)
+            if EVAL_CACHE and result.correct_log_str != "":
+                await put_cached_eval_result(eval_cache_key(model, served_model, question, correct_answer, incorrect_answers), model, incorrect_answers, result)
+            return result
+        cache_key = eval_cache_key(model, served_model, question, correct_answer, incorrect_answers)
+        if EVAL_CACHE:
+            if (cached := await get_cached_eval_result(cache_key, served_model, incorrect_answers)) is not None:
+                return cached
+        if cache_key in eval_flights:
+            scoring_stats.coalesced += 1
+        # the flight is scored with the API key of the request that started it;
+        # if the server refused that request, e.g. for its key, the others try with their own
+        shared = await eval_flights.do(cache_key, lambda: _score_shared(cache_key, model, served_model, question, correct_answer, incorrect_answers, api_key), own_errors=(openai.APIStatusError,))
+        if shared is None:
+            # rejected by the model, e.g. longer than its context window
+            return eval_result(False, 0.0, "", "", served_model)
+        return _from_cached(shared, served_model, incorrect_answers)
     return eval_result(False, 0.0, "", "", model)
-
@@ -17,6 +17,10 @@ if config.config_file_name is not None:
 from models import Base
 target_metadata = Base.metadata
 
+def include_name(name, type_, parent_names):
+    # the full text index and its shadow tables are managed by hand
+    return not (type_ == "table" and name.startswith("question_fts"))
+
 
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
@@ -36,6 +40,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -57,7 +62,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_name=include_name
         )
 
         with context.begin_transaction():
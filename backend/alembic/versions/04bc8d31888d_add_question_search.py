@@ -0,0 +1,52 @@
+"""add question search
+
+Revision ID: 04bc8d31888d
+Revises: 1ffcd9a7d3f2
+Create Date: 2026-10-18 16:02:37.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '04bc8d31888d'
+down_revision: Union[str, None] = '1ffcd9a7d3f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # an external content FTS5 index over question, the triggers keep it in step
+    op.execute("""CREATE VIRTUAL TABLE question_fts USING fts5(
+        question, correct_answer, support, comments,
+        content='question', content_rowid='id', tokenize='porter unicode61', prefix='2 3')""")
+    op.execute("""CREATE TRIGGER question_fts_insert AFTER INSERT ON question BEGIN
+        INSERT INTO question_fts(rowid, question, correct_answer, support, comments) VALUES (new.id, new.question, new.correct_answer, new.support, new.comments);
+    END""")
+    op.execute("""CREATE TRIGGER question_fts_delete AFTER DELETE ON question BEGIN
+        INSERT INTO question_fts(question_fts, rowid, question, correct_answer, support, comments) VALUES ('delete', old.id, old.question, old.correct_answer, old.support, old.comments);
+    END""")
+    op.execute("""CREATE TRIGGER question_fts_update AFTER UPDATE OF question, correct_answer, support, comments ON question BEGIN
+        INSERT INTO question_fts(question_fts, rowid, question, correct_answer, support, comments) VALUES ('delete', old.id, old.question, old.correct_answer, old.support, old.comments);
+        INSERT INTO question_fts(rowid, question, correct_answer, support, comments) VALUES (new.id, new.question, new.correct_answer, new.support, new.comments);
+    END""")
+    # index the existing questions
+    op.execute("INSERT INTO question_fts(question_fts) VALUES ('rebuild')")
+    # a page of search results loads its distractors, skills and domains by
+    # question id, the primary keys of the link tables start with the other id
+    op.create_index(op.f('ix_distractor_question_id'), 'distractor', ['question_id'], unique=False)
+    op.create_index(op.f('ix_skills_to_questions_question_id'), 'skills_to_questions', ['question_id'], unique=False)
+    op.create_index(op.f('ix_domains_to_questions_question_id'), 'domains_to_questions', ['question_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_domains_to_questions_question_id'), table_name='domains_to_questions')
+    op.drop_index(op.f('ix_skills_to_questions_question_id'), table_name='skills_to_questions')
+    op.drop_index(op.f('ix_distractor_question_id'), table_name='distractor')
+    op.execute("DROP TRIGGER question_fts_update")
+    op.execute("DROP TRIGGER question_fts_delete")
+    op.execute("DROP TRIGGER question_fts_insert")
+    op.execute("DROP TABLE question_fts")
@@ -0,0 +1,30 @@
+"""delete review queue with question
+
+Revision ID: 6731cf929627
+Revises: 83fa10c42033
+Create Date: 2026-10-18 22:41:05.527193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6731cf929627'
+down_revision: Union[str, None] = '83fa10c42033'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # rows of questions deleted so far; domain_review_summary_delete takes them out of the summary
+    op.execute("DELETE FROM review_queue WHERE question_id NOT IN (SELECT id FROM question)")
+    op.execute("""CREATE TRIGGER review_queue_question_delete AFTER DELETE ON question BEGIN
+        DELETE FROM review_queue WHERE question_id = old.id;
+    END""")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER review_queue_question_delete")
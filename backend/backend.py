@@ -2,7 +2,7 @@ import asyncio
 from fastapi import FastAPI, Depends, Request, Query, HTTPException, Header, UploadFile, File, Form
 from pathlib import Path
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse, FileResponse, PlainTextResponse
+from fastapi.responses import RedirectResponse, FileResponse, PlainTextResponse, StreamingResponse, Response
 from sqlalchemy.orm import Session
 import sqlalchemy as sa
 from typing import Optional, Annotated
@@ -11,18 +11,42 @@ from models import *
 from schemas import *
 from data_access import *
 from passlib.context import CryptContext
-from ai import test_question_impl, eval_result
+from contextlib import asynccontextmanager
+from ai import test_question_impl, eval_result, client_pool, scoring_stats, concurrency_limits, replica_sets, replicas_for, cassette, BackendOverloadedError, BackendUnavailableError, CassetteMissError
 import uuid
+from datetime import datetime
+import time
+import json
 import config
 import textwrap
 import export
+import bulk_scoring
+import health
+import model_config
+from scoring import SCORING_METHODS
 
 FILES_PATH = Path("files")
 FILES_PATH.mkdir(exist_ok=True)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 EVENT_PASSWORD = pwd_context.hash(config.EVENT_PASSWORD)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await asyncio.to_thread(prewarm_intern_cache)
+    background = []
+    if config.BACKEND_READY and config.LLM_PROBE_INTERVAL > 0 and config.CASSETTE_MODE != "replay":
+        background.append(asyncio.create_task(health.run_prober()))
+    if config.MODEL_CONFIG_FILE:
+        background.append(asyncio.create_task(model_config.watch_model_config(config.MODEL_CONFIG_FILE, config.MODEL_CONFIG_POLL_INTERVAL)))
+    yield
+    for task in background:
+        task.cancel()
+    # a probe still running would otherwise use a closed client
+    await asyncio.gather(*background, return_exceptions=True)
+    await bulk_scoring.cancel_running_jobs()
+    await client_pool.aclose()
+
+app = FastAPI(lifespan=lifespan)
 # UI static files and routes
 app.mount("/ui/assets/", StaticFiles(directory="ui/assets"), name="ui")
 
@@ -41,6 +65,25 @@ def root(request: Request):
 
 # API Routes
 
+# The list endpoints return a cursor to the next page in the X-Next-Cursor
+# header when the page is full.  It holds the sort key of the last row, so the
+# next page starts with an index lookup however deep it is; skip still works
+# and is applied after the cursor.
+def page_after(cursor: Optional[str], *types: type) -> Optional[list]:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, *types)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def set_next_cursor(response: Response, rows: list, limit: int, *key: str):
+    """
+    Set the cursor to the page after rows, whose sort key is made of the attributes key.
+    """
+    if rows and len(rows) >= limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(*(getattr(rows[-1], attribute) for attribute in key))
+
 @app.post("/api/login", response_model=TokenSchema)
 def login(login_req: LoginSchema):
     if pwd_context.verify(login_req.password, EVENT_PASSWORD):
@@ -56,20 +99,25 @@ def login(login_req: LoginSchema):
 @app.post("/api/author", response_model=AuthorSchema)
 def store_author(author: CreateAuthorSchema, db: Session = Depends(get_db)):
     a = create_or_select_author(db, author)
-    return AuthorSchema(
+    response = AuthorSchema(
             id=a.id,
             name=a.name,
             position=a.position.name,
             affilliation=a.affiliation.name,
             orcid=a.orcid
             )
+    db.commit()
+    return response
 
 @app.get("/api/author", response_model=list[AuthorSchema])
-def list_authors(name: Optional[str] = None, db: Session = Depends(get_db), limit:int=100, skip:int=0):
-    results = db.query(Author)
+def list_authors(response: Response, name: Optional[str] = None, db: Session = Depends(get_db), limit:int=100, skip:int=0, cursor: Optional[str] = None):
+    results = db.query(Author).order_by(Author.id)
     if name is not None:
         results = results.filter(Author.name == name)
+    if (after := page_after(cursor, int)) is not None:
+        results = results.filter(Author.id > after[0])
     results = results.offset(skip).limit(limit).all()
+    set_next_cursor(response, results, limit, "id")
     return [AuthorSchema(
                 id=i.id,
                 name=i.name,
@@ -93,23 +141,35 @@ def get_author(id: int, db: Session = Depends(get_db)):
 
 
 @app.get("/api/positions", response_model=list[str])
-def list_positions(db: Session = Depends(get_db), q:str="", limit:int=100, skip:int=0):
+def list_positions(response: Response, db: Session = Depends(get_db), q:str="", limit:int=100, skip:int=0, cursor: Optional[str] = None):
+    results = db.query(Position.id, Position.name).order_by(Position.id)
     if q == "":
-        return [i.name for i in db.query(Position.name).filter(Position.name != "").offset(skip).limit(limit).all()]
+        results = results.filter(Position.name != "")
     else:
-        return [i.name for i in db.query(Position.name).filter(Position.name.ilike(f"%{q.strip()}%")).offset(skip).limit(limit).all()]
+        results = results.filter(Position.name.ilike(f"%{q.strip()}%"))
+    if (after := page_after(cursor, int)) is not None:
+        results = results.filter(Position.id > after[0])
+    results = results.offset(skip).limit(limit).all()
+    set_next_cursor(response, results, limit, "id")
+    return [i.name for i in results]
 
 @app.get("/api/affiliations", response_model=list[str])
-def list_affiliations(db: Session = Depends(get_db), q:str="", limit:int=100, skip:int=0):
+def list_affiliations(response: Response, db: Session = Depends(get_db), q:str="", limit:int=100, skip:int=0, cursor: Optional[str] = None):
+    results = db.query(Affiliation.id, Affiliation.name).order_by(Affiliation.id)
     if q == "":
-        return [i.name for i in db.query(Affiliation.name).filter(Affiliation.name != "").offset(skip).limit(limit).all()]
+        results = results.filter(Affiliation.name != "")
     else:
-        return [i.name for i in db.query(Affiliation.name).filter(Affiliation.name.ilike(f"%{q.strip()}%")).offset(skip).limit(limit).all()]
+        results = results.filter(Affiliation.name.ilike(f"%{q.strip()}%"))
+    if (after := page_after(cursor, int)) is not None:
+        results = results.filter(Affiliation.id > after[0])
+    results = results.offset(skip).limit(limit).all()
+    set_next_cursor(response, results, limit, "id")
+    return [i.name for i in results]
 
 @app.post("/api/question", response_model=QuestionSchema)
 def store_question(question: CreateQuestionSchema, db: Session = Depends(get_db)):
     q = create_question(db, question)
-    return QuestionSchema(
+    response = QuestionSchema(
             id=q.id,
             question=q.question,
             correct_answer=q.correct_answer,
@@ -122,9 +182,14 @@ def store_question(question: CreateQuestionSchema, db: Session = Depends(get_db)
             support=q.support,
             comments=q.comments,
             )
+    db.commit()
+    return response
 
 @app.get("/api/question", response_model=list[QuestionSchema])
-def get_questions(db: Session = Depends(get_db), author_ids: Annotated[list[int] | None, Query()] = None, skip:int=0, limit:int=100, q:Optional[str]=None, ids: Annotated[list[int] | None, Query()] = None, domain: Annotated[list[int] | None, Query()] = None, validated: Optional[bool] = None):
+def get_questions(response: Response, db: Session = Depends(get_db), author_ids: Annotated[list[int] | None, Query()] = None, skip:int=0, limit:int=100, q:Optional[str]=None, ids: Annotated[list[int] | None, Query()] = None, domain: Annotated[list[int] | None, Query()] = None, validated: Optional[bool] = None, cursor: Optional[str] = None):
+    after = page_after(cursor, int)
+    questions = list_questions(db, skip, limit, author_ids=author_ids, query=q, ids=ids, domains=domain, validated=validated, after_id=after[0] if after else None)
+    set_next_cursor(response, questions, limit, "id")
     return [QuestionSchema(
                 id=i.id,
                 question=i.question,
@@ -138,17 +203,33 @@ def get_questions(db: Session = Depends(get_db), author_ids: Annotated[list[int]
                 support=i.support,
                 comments=i.comments,
             )
-            for i in list_questions(db, skip, limit, author_ids=author_ids, query=q, ids=ids, domains=domain, validated=validated)]
+            for i in questions]
+
+# before /api/question/{id}, which would match it first
+@app.get("/api/question/search", response_model=list[QuestionSearchResultSchema])
+def get_question_search(q: str, db: Session = Depends(get_db), skip: int = 0, limit: int = 20):
+    return [QuestionSearchResultSchema(
+                question=QuestionSchema(
+                    id=i.id,
+                    question=i.question,
+                    correct_answer=i.correct_answer,
+                    distractors=[d.text for d in i.distractors],
+                    skills=[s.name for s in i.skills],
+                    domains=[d.name for d in i.domains],
+                    difficulty=i.difficulty.name,
+                    doi=i.doi,
+                    author=i.author.id,
+                    support=i.support,
+                    comments=i.comments,
+                ),
+                snippet=snippet,
+                score=score,
+            )
+            for i, snippet, score in search_questions(db, q, skip, limit)]
 
 @app.get("/api/question/{id}", response_model=QuestionSchema)
 def get_question(id :int, db: Session = Depends(get_db)):
-    i = db.query(Question).options(
-            joinedload(Question.author),
-            joinedload(Question.distractors),
-            joinedload(Question.domains),
-            joinedload(Question.skills),
-            joinedload(Question.difficulty)
-            ).get(id)
+    i = db.query(Question).options(*QUESTION_LOAD_OPTIONS).get(id)
     if i is None:
         raise KeyError(f"question {id} is not found")
     return QuestionSchema(
@@ -166,13 +247,16 @@ def get_question(id :int, db: Session = Depends(get_db)):
             )
 
 @app.get("/api/review", response_model=list[ReviewSchema])
-def list_reviews(limit:int=100, reviewer_id:Optional[int]=None, question_id:Optional[int]=None, skip:int=0, db: Session =Depends(get_db)):
-    query  = db.query(Review)
+def list_reviews(response: Response, limit:int=100, reviewer_id:Optional[int]=None, question_id:Optional[int]=None, skip:int=0, cursor: Optional[str] = None, db: Session =Depends(get_db)):
+    query  = db.query(Review).order_by(Review.id)
     if reviewer_id is not None:
         query = query.filter(Review.author_id == reviewer_id)
     if question_id is not None:
         query = query.filter(Review.question_id == question_id)
+    if (after := page_after(cursor, int)) is not None:
+        query = query.filter(Review.id > after[0])
     query = query.limit(limit).offset(skip).all()
+    set_next_cursor(response, query, limit, "id")
     return [ReviewSchema(
         id=r.id,
         author=r.author.id,
@@ -231,13 +315,12 @@ def update_question(question_id: int, changes: CreateQuestionSchema, db: Session
         if set(changes.distractors) != set(i.text for i in q.distractors):
             q.distractors = [Distractor(text=d) for d in changes.distractors]
         q.author_id = create_or_select_author(db, changes.author).id
-        q.skills=[insert_or_select(db, Skill, s) for s in changes.skills],
-        q.domains=[insert_or_select(db, Domain, d) for d in changes.domains],
-        q.difficulty=insert_or_select(db, Difficulty, changes.difficulty),
+        q.skills=[insert_or_select(db, Skill, s) for s in changes.skills]
+        q.domains=[insert_or_select(db, Domain, d) for d in changes.domains]
+        q.difficulty=insert_or_select(db, Difficulty, changes.difficulty)
         db.add(q)
-        db.commit()
-        db.refresh(q)
-        return QuestionSchema(
+        db.flush()
+        response = QuestionSchema(
                 id=q.id,
                 question=q.question,
                 correct_answer=q.correct_answer,
@@ -246,10 +329,12 @@ def update_question(question_id: int, changes: CreateQuestionSchema, db: Session
                 domains=[d.name for d in q.domains],
                 difficulty=q.difficulty.name,
                 doi=q.doi,
-                author=q.author.id,
+                author=q.author_id,
                 support=q.support,
                 comments=q.comments,
                 )
+        db.commit()
+        return response
     else:
         KeyError(f"Question {question_id} is not found")
 
@@ -275,9 +360,8 @@ def update_review(review_id:int, review: CreateReviewSchema, db: Session =Depend
         r.accept=review.accept
         r.modified=func.current_timestamp()
         db.add(r)
-        db.commit()
-        db.refresh(r)
-        return ReviewSchema(
+        db.flush()
+        response = ReviewSchema(
             id=r.id,
             author=a.id,
             question_id=r.question_id,
@@ -295,7 +379,9 @@ def update_review(review_id:int, review: CreateReviewSchema, db: Session =Depend
             domaincorrect=r.domaincorrect,
             comments=r.comments,
             accept=r.accept,
-        ) 
+        )
+        db.commit()
+        return response
     else:
         KeyError(f"Review {review_id} is not found")
 
@@ -303,19 +389,18 @@ def update_review(review_id:int, review: CreateReviewSchema, db: Session =Depend
 @app.post("/api/skip")
 def skip_review(skip_request: SkipSchema, db: Session =Depends(get_db)):
     author = create_or_select_author(db, skip_request.author)
-    try:
-        db.execute(Skips.insert().values(author_id=author.id, question_id=skip_request.question_id))
-        db.commit()
-    except sa.exc.IntegrityError:
-        #ignore attempts to insert the same skip multiple times
-        pass
+    #ignore attempts to insert the same skip multiple times
+    db.execute(sqlite_insert(Skips).values(author_id=author.id, question_id=skip_request.question_id).on_conflict_do_nothing())
+    release_review_lease(db, skip_request.question_id, author.id)
+    db.commit()
 
 
 @app.post("/api/review", response_model=ReviewSchema)
 def store_review(review: CreateReviewSchema, db: Session =Depends(get_db)):
     r = create_review(db, review)
     db.query(Skips).filter(Skips.c.author_id == r.author.id, Skips.c.question_id == review.question_id).delete(synchronize_session='evaluate')
-    return ReviewSchema(
+    release_review_lease(db, review.question_id, r.author.id)
+    response = ReviewSchema(
         id=r.id,
         author=r.author.id,
         question_id=r.question_id,
@@ -334,14 +419,21 @@ def store_review(review: CreateReviewSchema, db: Session =Depends(get_db)):
         comments=r.comments,
         accept=r.accept,
     )
+    db.commit()
+    return response
 
 @app.get("/api/reviewhistory/{author_id}", response_model=list[History])
-def reviewer_history(author_id: int, db: Session = Depends(get_db), limit:int=10, skip:int=0):
+def reviewer_history(response: Response, author_id: int, db: Session = Depends(get_db), limit:int=10, skip:int=0, cursor: Optional[str] = None):
+    # newest first, keyed on the modified time as stored, the question and the review (0 for a skip)
+    reviews_key = (sa.type_coerce(Review.modified, sa.String), Review.question_id, Review.id)
+    skips_key = (sa.type_coerce(Skips.c.modified, sa.String), Skips.c.question_id, sa.literal(0))
     reviews = (db.query(Review.id, sa.case((Review.accept == True, 'approved'),
                                           else_='rejected').label("accept"),
                        Question.question.label("question"),
                        Review.question_id.label("question_id"),
-                       Review.modified.label("modified"))
+                       Review.modified.label("modified"),
+                       reviews_key[0].label("modified_key"),
+                       reviews_key[2].label("key_id"))
                        .join(Question, Question.id == Review.question_id)
                        .filter(Review.author_id == author_id)
                )
@@ -349,11 +441,17 @@ def reviewer_history(author_id: int, db: Session = Depends(get_db), limit:int=10
                      sa.sql.literal('skip').label("skipped"),
                      Question.question.label("question"),
                      Skips.c.question_id.label("question_id"),
-                     Skips.c.modified.label("modified"))
+                     Skips.c.modified.label("modified"),
+                     skips_key[0].label("modified_key"),
+                     skips_key[2].label("key_id"))
              .join(Question, Question.id == Skips.c.question_id)
              .filter(Skips.c.author_id == author_id)
              )
-    history = reviews.union_all(skips).order_by(sa.desc('modified')).limit(limit).offset(skip).all()
+    if (after := page_after(cursor, str, int, int)) is not None:
+        reviews = reviews.filter(sa.tuple_(*reviews_key) < sa.tuple_(*after))
+        skips = skips.filter(sa.tuple_(*skips_key) < sa.tuple_(*after))
+    history = reviews.union_all(skips).order_by(sa.desc('modified_key'), sa.desc('question_id'), sa.desc('key_id')).limit(limit).offset(skip).all()
+    set_next_cursor(response, history, limit, "modified_key", "question_id", "key_id")
 
     return [History(
                 question_id=h.question_id,
@@ -571,32 +669,251 @@ def get_contributions(author_id : int, validations: int = 3, db: Session = Depen
 
 @app.post("/api/review_batch", response_model=list[int])
 def get_review_batch(reviewer: ReviewerSchema, db: Session = Depends(get_db), limit:Optional[int]=None, validations:int = 1):
-    return [r.id for r in select_review_batch(db, reviewer, limit, validations)]
+    return select_review_batch(db, reviewer, limit, validations)
+
+def eval_schema(t: eval_result) -> QuestionEvalSchema:
+    return QuestionEvalSchema(model=t.model, score=t.score, correct=t.is_correct, corectlogprobs=t.correct_log_str, incorrectlogprobs=t.incorrect_log_str)
+
+async def evaluate_model(model: str, served_model: str, question: CreateQuestionSchema, api_key: str, deadline: float) -> eval_result:
+    try:
+        async with asyncio.timeout(deadline) as cm:
+            return await test_question_impl(model, question.question, question.correct_answer, question.distractors, api_key, served_model=served_model)
+    except TimeoutError:
+        if cm.expired():
+            scoring_stats.deadlines_exceeded += 1
+            raise TimeoutError(f"{served_model} did not finish within {deadline}s")
+        raise
+
+def request_deadline(deadline: Optional[float]) -> float:
+    if deadline is None:
+        return config.TEST_QUESTION_DEADLINE
+    return min(deadline, config.TEST_QUESTION_DEADLINE)
+
+async def cancel_on_disconnect(request: Request, task: asyncio.Task):
+    while not task.done():
+        if await request.is_disconnected():
+            scoring_stats.disconnects += 1
+            task.cancel()
+            return
+        await asyncio.sleep(config.DISCONNECT_POLL_INTERVAL)
 
 @app.post("/api/test_question", response_model=list[QuestionEvalSchema])
-async def test_question(question: CreateQuestionSchema, authorization: Annotated[str, Header()]):
+async def test_question(request: Request, question: CreateQuestionSchema, authorization: Annotated[str, Header()], deadline: Optional[float] = None):
     api_key = authorization.split(":")[1].strip()
-    results: list[asyncio.Task[eval_result]] = []
-    try:
+    deadline = request_deadline(deadline)
+    # one snapshot for the whole request, a reload of the model map replaces the dict rather than changing it
+    model_map = config.MODEL_NAME_MAP
+
+    async def evaluate_all() -> list[eval_result]:
+        results: list[asyncio.Task[eval_result]] = []
         async with asyncio.TaskGroup() as tg:
-            for model in config.MODEL_NAME_MAP:
-                results.append(tg.create_task(test_question_impl(model, question.question, question.correct_answer, question.distractors, api_key)))
-        task_results: list[eval_result] = [t.result() for t in results]
-        return [QuestionEvalSchema(model=t.model, score=t.score, correct=t.is_correct, corectlogprobs=t.correct_log_str, incorrectlogprobs=t.incorrect_log_str) for t in task_results]
-    except* TimeoutError as e:
+            for model, served_model in model_map.items():
+                results.append(tg.create_task(evaluate_model(model, served_model, question, api_key, deadline)))
+        return [t.result() for t in results]
+
+    evaluation = asyncio.create_task(evaluate_all())
+    watcher = asyncio.create_task(cancel_on_disconnect(request, evaluation))
+    try:
+        await asyncio.wait([evaluation])
+    finally:
+        watcher.cancel()
+        evaluation.cancel()
+    if evaluation.cancelled():
+        # nobody is left to read the response
+        return Response(status_code=499)
+    try:
+        task_results: list[eval_result] = evaluation.result()
+        return [eval_schema(t) for t in task_results]
+    except* (TimeoutError, BackendOverloadedError, BackendUnavailableError, CassetteMissError) as e:
         err_msgs = []
         for i in e.exceptions:
             err_msgs.append(repr(i))
-        raise HTTPException(status_code=503, detail="\n".join(err_msgs))
+        overloaded = all(isinstance(i, BackendOverloadedError) for i in e.exceptions)
+        raise HTTPException(status_code=429 if overloaded else 503, detail="\n".join(err_msgs))
+
+@app.post("/api/test_question/stream", response_class=StreamingResponse)
+async def test_question_stream(question: CreateQuestionSchema, authorization: Annotated[str, Header()], deadline: Optional[float] = None):
+    """
+    newline delimited JSON with one QuestionEvalSchema per model in the order
+    the models finish, or a QuestionEvalErrorSchema for a model that timed out,
+    is overloaded or down, or has no recorded answer in replay mode
+
+    outstanding models are cancelled when the client disconnects
+    """
+    api_key = authorization.split(":")[1].strip()
+    deadline = request_deadline(deadline)
+
+    # one snapshot for the whole request, the models are only scored once the response starts streaming
+    model_map = config.MODEL_NAME_MAP
+
+    async def evaluate(model: str) -> QuestionEvalSchema|QuestionEvalErrorSchema:
+        try:
+            return eval_schema(await evaluate_model(model, model_map[model], question, api_key, deadline))
+        except (TimeoutError, BackendOverloadedError, BackendUnavailableError, CassetteMissError) as e:
+            return QuestionEvalErrorSchema(model=model_map[model], error=repr(e))
+
+    async def stream_results():
+        tasks = [asyncio.create_task(evaluate(model)) for model in model_map]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield (await next_result).model_dump_json() + "\n"
+        finally:
+            # starlette stops iterating when the client disconnects
+            if not all(t.done() for t in tasks):
+                scoring_stats.disconnects += 1
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+def scoring_job_schema(job: ScoringJob) -> ScoringJobSchema:
+    return ScoringJobSchema(
+        id=job.id,
+        models=json.loads(job.models),
+        validations=job.validations,
+        status=job.status,
+        total=job.total,
+        completed=job.completed,
+        checkpoint=job.checkpoint,
+        error=job.error,
+        failed=job.failed,
+        created=job.created,
+        modified=job.modified,
+    )
 
-        
+@app.post("/api/scoring_jobs", response_model=ScoringJobSchema)
+async def start_scoring_job(job: CreateScoringJobSchema, authorization: Annotated[str, Header()]):
+    api_key = authorization.split(":")[1].strip()
+    models = job.models or list(config.MODEL_NAME_MAP)
+    if unknown := [m for m in models if m not in config.MODEL_NAME_MAP]:
+        raise HTTPException(status_code=422, detail=f"unknown models {unknown}")
+    db_job = await asyncio.to_thread(bulk_scoring.create_job, models, job.validations)
+    db_job = await asyncio.to_thread(bulk_scoring.claim_job, db_job.id)
+    if db_job is None:
+        raise HTTPException(status_code=409, detail="Scoring job was claimed by another worker")
+    bulk_scoring.start_scoring_job(db_job, api_key)
+    return scoring_job_schema(db_job)
+
+@app.get("/api/scoring_jobs/{job_id}", response_model=ScoringJobSchema)
+def get_scoring_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(ScoringJob).get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Scoring job not found")
+    return scoring_job_schema(job)
+
+@app.post("/api/scoring_jobs/{job_id}/resume", response_model=ScoringJobSchema)
+async def resume_scoring_job(job_id: int, authorization: Annotated[str, Header()]):
+    api_key = authorization.split(":")[1].strip()
+    job = await asyncio.to_thread(bulk_scoring.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Scoring job not found")
+    if job.status == "complete" or job_id in bulk_scoring.running_jobs:
+        raise HTTPException(status_code=409, detail=f"Scoring job is {job.status}")
+    try:
+        bulk_scoring.served_models(json.loads(job.models))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    # claimed before answering, so a job another worker is running is refused here rather than failing in the background
+    job = await asyncio.to_thread(bulk_scoring.claim_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=409, detail="Scoring job is complete or running in another worker")
+    bulk_scoring.start_scoring_job(job, api_key)
+    return scoring_job_schema(job)
+
+@app.get("/api/reports/question_scores", response_model=list[QuestionScoreSchema])
+def report_question_scores(model: Optional[str] = None, question_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    scores = db.query(QuestionScore)
+    if model is not None:
+        scores = scores.filter(QuestionScore.model == model)
+    if question_id is not None:
+        scores = scores.filter(QuestionScore.question_id == question_id)
+    return [QuestionScoreSchema(
+                question_id=s.question_id,
+                job_id=s.job_id,
+                model=s.model,
+                score=s.score,
+                correct=s.is_correct,
+                corectlogprobs=s.correct_log_str,
+                incorrectlogprobs=s.incorrect_log_str,
+            ) for s in scores.order_by(QuestionScore.question_id).offset(skip).limit(limit).all()]
+
+@app.get("/api/reports/rescore", response_model=list[RescoredQuestionSchema])
+def report_rescore(model: str, method: str = "token_normalized", question_id: Annotated[Optional[list[int]], Query()] = None):
+    if method not in SCORING_METHODS:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"method must be one of {', '.join(SCORING_METHODS)}")
+    return [RescoredQuestionSchema(question_id=r["question_id"], model=model, method=method, score=r["score"], correct=r["is_correct"])
+            for r in bulk_scoring.rescore_stored(model, method, question_id)]
+
+
+def model_status(name: str, model: str) -> ModelStatusSchema:
+    replicas = replicas_for(model).replicas
+    probed = [r.probe for r in replicas if r.probe is not None]
+    up = [p for p in probed if p.up]
+    if not probed:
+        state = ModelState.unknown
+    elif any(not r.down for r in replicas):
+        state = ModelState.up
+    else:
+        state = ModelState.down
+    return ModelStatusSchema(
+        name=name,
+        model=model,
+        state=state,
+        replicas_up=len(up),
+        replicas=len(replicas),
+        latency_ms=min(p.latency for p in up) * 1000 if up else None,
+        checked=datetime.fromtimestamp(max(p.checked for p in probed)) if probed else None,
+        error="; ".join(p.error for p in probed if not p.up),
+    )
 
 @app.get("/api/status", response_model=StatusSchema)
 def get_status():
-    #todo check if inference backend is online and serving requests
+    """
+    Model states are the latest results of the background health probes, this never waits on the inference servers.
+    """
     # if it is not yet started, this api should request a start
     return StatusSchema(
-        authoring= SystemStatus.ready if config.BACKEND_READY else SystemStatus.disabled
+        authoring= SystemStatus.ready if config.BACKEND_READY else SystemStatus.disabled,
+        models=[model_status(name, model) for name, model in config.MODEL_NAME_MAP.items()] if config.BACKEND_READY else [],
+    )
+
+
+@app.get("/api/metrics", response_model=MetricsSchema)
+def get_metrics():
+    return MetricsSchema(
+        llm_clients=ClientPoolStatsSchema.model_validate(client_pool.stats),
+        scoring=ScoringStatsSchema.model_validate(scoring_stats),
+        llm_limits=[ModelConcurrencySchema(
+            model=limiter.model,
+            base_url=limiter.base_url,
+            limit=limiter.limit,
+            in_flight=limiter.in_flight,
+            waiting=limiter.waiting,
+            completed=limiter.stats.completed,
+            backoffs=limiter.stats.backoffs,
+            rejected=limiter.stats.rejected,
+        ) for limiter in list(concurrency_limits.values())],
+        llm_replicas=[ReplicaSchema(
+            model=r.model,
+            base_url=r.base_url,
+            outstanding=r.outstanding,
+            requests=r.stats.requests,
+            failures=r.stats.failures,
+            ejections=r.stats.ejections,
+            ejected=r.ejected(time.monotonic()),
+            down=r.down,
+            probes=r.stats.probes,
+            probe_failures=r.stats.probe_failures,
+        ) for replicas in list(replica_sets.values()) for r in replicas.replicas],
+        prober=ProberStatsSchema.model_validate(health.prober_stats),
+        interning=InternCacheStatsSchema.model_validate(intern_cache.stats),
+        cassette=CassetteStatsSchema(
+            mode=config.CASSETTE_MODE,
+            hits=cassette.stats.hits,
+            misses=cassette.stats.misses,
+            recorded=cassette.stats.recorded,
+        ) if cassette is not None else None,
     )
 
 
@@ -640,15 +957,14 @@ def create_experiment_turn(turn: CreateExperimentTurnSchema, db: Session = Depen
         other_task_assessment=turn.other_task_assessment,
     )
     db.add(new_turn)
-    db.commit()
-    db.refresh(new_turn)
+    db.flush()
 
     create_justified_skill(db, new_turn.id, turn.hypothesis)
     create_justified_skill(db, new_turn.id, turn.analysis)
     create_justified_skill(db, new_turn.id, turn.review)
     create_justified_skill(db, new_turn.id, turn.conclusions)
     create_justified_skill(db, new_turn.id, turn.planning)
-
+    db.commit()
 
     return new_turn.id
 
@@ -692,8 +1008,7 @@ def create_preliminary_evaluation(preliminary: CreatePreliminaryEvaluationSchema
         goal = preliminary.goal
     )
     db.add(new_preliminary_evaluation)
-    db.commit()
-    db.refresh(new_preliminary_evaluation)
+    db.flush()
     db.query(ExperimentLog).filter(ExperimentLog.id == preliminary.experiment_id).update({"preliminary_evaluation_id": new_preliminary_evaluation.id})
     db.commit()
     
@@ -740,8 +1055,7 @@ def create_final_evaluation(evaluation: CreateFinalEvaluationSchema, db: Session
         daily_use = evaluation.daily_use,
     )
     db.add(new_evaluation)
-    db.commit()
-    db.refresh(new_evaluation)
+    db.flush()
     db.query(ExperimentLog).filter(ExperimentLog.id == evaluation.experiment_id).update({"final_evaluation_id": new_evaluation.id})
     db.commit()
     return new_evaluation.id
@@ -775,22 +1089,23 @@ async def create_experiment_turn_file(
     db.refresh(file_metadata)
     return file_metadata.id
 
+# Both read the running totals the triggers keep in the *_summary tables
+# instead of grouping every question and review.
 @app.get("/api/reports/reviews_needed", response_model=ReviewRemaining)
-async def reviews_needed(validations: int = 1, db: Session = Depends(get_db)):
-    unvalidated_questions = (db.query(Question.id.label("id"))
-        .outerjoin(Review, Question.id == Review.question_id, full=True)
-        .group_by(Question.id)
-        .having(func.count(Review.id) < validations)
-       ).subquery()
+def reviews_needed(validations: int = 1, db: Session = Depends(get_db)):
+    questions = func.sum(DomainReviewSummary.c.questions)
     remaining = (
-            db.query(Domain.name, func.count(Domain.id))
-            .select_from(unvalidated_questions)
-            .join(domains_to_questions, unvalidated_questions.c.id == domains_to_questions.c.question_id)
-            .join(Domain, domains_to_questions.c.domain_id == Domain.id)
+            db.query(Domain.name, questions)
+            .select_from(DomainReviewSummary)
+            .join(Domain, DomainReviewSummary.c.domain_id == Domain.id)
+            .filter(DomainReviewSummary.c.review_count < validations)
             .group_by(func.lower(Domain.name))
-            .order_by(func.count(Domain.id).desc())
+            .having(questions > 0)
+            .order_by(questions.desc())
      )
-    c = db.query(func.count(unvalidated_questions.c.id)).select_from(unvalidated_questions).scalar()
+    c = (db.query(func.sum(ReviewCountSummary.c.questions))
+         .filter(ReviewCountSummary.c.review_count < validations)
+         .scalar() or 0)
 
     return ReviewRemaining(values=
         [ReviewRemainingItem(key="total", count=c)] + 
@@ -798,10 +1113,10 @@ async def reviews_needed(validations: int = 1, db: Session = Depends(get_db)):
         )
 
 @app.get("/api/reports/reviewers_progress", response_model=ReviewRemaining)
-async def reviewers_progress(db: Session = Depends(get_db)):
-    so_far = (db.query(Author.name, func.count(Review.author_id))
-              .join(Author)
-              .group_by(Review.author_id)
+def reviewers_progress(db: Session = Depends(get_db)):
+    so_far = (db.query(Author.name, ReviewerSummary.c.reviews)
+              .join(Author, ReviewerSummary.c.author_id == Author.id)
+              .filter(ReviewerSummary.c.reviews > 0)
               .order_by(
                   func.lower(
                       func.trim(
@@ -0,0 +1,124 @@
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+from config import LLM_HEALTH_WINDOW, LLM_EJECT_ERROR_RATE, LLM_EJECT_MIN_REQUESTS, LLM_EJECT_TIME, LLM_EJECT_MAX_TIME, LLM_PROBE_FAILURES
+
+@dataclass
+class ReplicaStats:
+    requests: int = 0
+    failures: int = 0
+    ejections: int = 0
+    probes: int = 0
+    probe_failures: int = 0
+
+@dataclass
+class ProbeResult:
+    up: bool
+    latency: float # seconds
+    checked: float # unix time
+    error: str = ""
+
+@dataclass
+class Replica:
+    model: str
+    base_url: str
+    outstanding: int = 0
+    ejected_until: float = 0.0
+    # consecutive ejections, each one lasts longer
+    strikes: int = 0
+    recent: deque[bool] = field(default_factory=deque) # True for a failure
+    stats: ReplicaStats = field(default_factory=ReplicaStats)
+    # active health checks, see health.py
+    probe: Optional[ProbeResult] = None
+    failed_probes: int = 0 # in a row
+    down: bool = False # the circuit is open, no requests are sent until a probe succeeds
+
+    def ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+class ReplicaSet:
+    """
+    The base URLs serving one model, with least outstanding requests routing and passive health checks.
+
+    Each replica keeps the outcome of its last window requests.  When at least
+    min_requests of them are recorded and the share of failures reaches
+    error_rate the replica is ejected for eject_time seconds, doubling for
+    every ejection in a row up to max_eject_time, and is picked again
+    afterwards; a success resets the count.  If every replica is ejected the
+    one due back first is used rather than failing the request.
+
+    A replica that fails probe_failures health probes in a row is down and
+    gets no requests at all until a probe succeeds again; see available().
+    """
+    def __init__(self,
+                 model: str,
+                 base_urls: list[str],
+                 window: int = LLM_HEALTH_WINDOW,
+                 error_rate: float = LLM_EJECT_ERROR_RATE,
+                 min_requests: int = LLM_EJECT_MIN_REQUESTS,
+                 eject_time: float = LLM_EJECT_TIME,
+                 max_eject_time: float = LLM_EJECT_MAX_TIME,
+                 probe_failures: int = LLM_PROBE_FAILURES):
+        self.model = model
+        self.window = window
+        self.replicas = [Replica(model, url, recent=deque(maxlen=window)) for url in base_urls]
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.eject_time = eject_time
+        self.max_eject_time = max_eject_time
+        self.probe_failures = probe_failures
+
+    def update(self, base_urls: list[str]):
+        """
+        Serve the model from base_urls, keeping the state of replicas that remain.
+        """
+        current = {r.base_url: r for r in self.replicas}
+        self.replicas = [current.get(url) or Replica(self.model, url, recent=deque(maxlen=self.window)) for url in base_urls]
+
+    def available(self) -> bool:
+        """
+        False when the health probes found every replica down.
+        """
+        return any(not r.down for r in self.replicas)
+
+    def pick(self, exclude: frozenset[str]|set[str] = frozenset()) -> Optional[Replica]:
+        """
+        The healthy replica with the fewest outstanding requests, None if every replica is excluded or down.
+        """
+        candidates = [r for r in self.replicas if r.base_url not in exclude and not r.down]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        healthy = [r for r in candidates if not r.ejected(now)]
+        if not healthy:
+            return min(candidates, key=lambda r: r.ejected_until)
+        fewest = min(r.outstanding for r in healthy)
+        return random.choice([r for r in healthy if r.outstanding == fewest])
+
+    def success(self, replica: Replica):
+        replica.stats.requests += 1
+        replica.recent.append(False)
+        replica.strikes = 0
+
+    def failure(self, replica: Replica):
+        replica.stats.requests += 1
+        replica.stats.failures += 1
+        replica.recent.append(True)
+        if len(replica.recent) >= self.min_requests and sum(replica.recent) / len(replica.recent) >= self.error_rate:
+            replica.stats.ejections += 1
+            replica.strikes += 1
+            replica.ejected_until = time.monotonic() + min(self.max_eject_time, self.eject_time * 2 ** (replica.strikes - 1))
+            replica.recent.clear()
+
+    def probed(self, replica: Replica, result: ProbeResult):
+        replica.probe = result
+        replica.stats.probes += 1
+        if result.up:
+            replica.failed_probes = 0
+            replica.down = False
+        else:
+            replica.stats.probe_failures += 1
+            replica.failed_probes += 1
+            replica.down = replica.failed_probes >= self.probe_failures
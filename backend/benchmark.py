@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Throughput benchmark of the question scoring path against mock_vllm.
+
+The real FastAPI app is driven in-process through httpx.ASGITransport and its
+completion requests are answered by the mock server (also in-process unless
+--llm-url points at a running one), so results only depend on the code and
+the mock settings.
+
+    python benchmark.py --scenario test_question --requests 500 --concurrency 32 --latency-mean 0.05
+
+Scenarios:
+    test_question  POST /api/test_question
+    stream         POST /api/test_question/stream, read to the end
+    impl           ai.test_question_impl for every model, without HTTP
+
+Questions are distinct unless --distinct is given, in which case requests
+cycle through that many questions and later requests may be served by the
+eval cache.  Each run uses a new temporary database so earlier runs do not
+warm the cache.
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import tempfile
+import time
+import mock_vllm
+
+BENCHMARK_LLM_URL = "http://mock-vllm/v1/"
+
+def replica_url(i: int) -> str:
+    return f"http://mock-vllm-{i}/v1/"
+
+def make_question(i: int, distractors: int) -> dict:
+    return {
+        "question": f"In benchmark scenario {i}, which quantity is conserved when a closed system undergoes an adiabatic reversible process?",
+        "correct_answer": f"entropy of the system, case {i}",
+        "distractors": [f"distractor {d} for case {i}: the temperature of the surroundings" for d in range(distractors)],
+        "skills": [],
+        "domains": [],
+        "difficulty": "",
+        "doi": "",
+        "author": 0,
+    }
+
+def summarize(latencies: list[float], elapsed: float, failures: int, questions: int, mock_stats: "mock_vllm.MockStats") -> dict:
+    import numpy as np
+    lat = np.asarray(latencies) if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "failures": failures,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(float(np.percentile(lat, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(lat, 99)) * 1000, 2),
+        "mean_ms": round(float(lat.mean()) * 1000, 2),
+        "llm_calls_per_question": round(mock_stats.requests / questions, 3) if questions else 0.0,
+        "llm_prompts_per_question": round(mock_stats.prompts / questions, 3) if questions else 0.0,
+        "llm_errors": mock_stats.errors,
+        "llm_max_in_flight": mock_stats.max_in_flight,
+    }
+
+class HostRouter:
+    """
+    httpx transport sending each request to the in-process app for its host, so replicas can be told apart.
+    """
+    def __init__(self, transports: dict):
+        self.transports = transports
+
+    async def handle_async_request(self, request):
+        return await self.transports[request.url.host].handle_async_request(request)
+
+    async def aclose(self):
+        pass
+
+async def run(args) -> dict:
+    # imported here so the QUESTIONSUI_ settings from the command line are in place first
+    import httpx
+    import config
+    import models
+    import ai
+    import backend
+
+    models.engine.echo = False
+    models.Base.metadata.create_all(models.engine)
+    mock_config = mock_vllm.config_from_arguments(args)
+    if args.replicas > 1:
+        # one mock per replica host, the first failing_replicas of them always fail
+        mocks = {f"mock-vllm-{i}": mock_vllm.create_app(dataclasses.replace(mock_config, seed=mock_config.seed + i, error_rate=1.0 if i < args.failing_replicas else mock_config.error_rate))
+                 for i in range(args.replicas)}
+    else:
+        mocks = {"mock-vllm": mock_vllm.create_app(mock_config)}
+    if args.llm_url is None:
+        ai.client_pool.transport = HostRouter({host: httpx.ASGITransport(app=app) for host, app in mocks.items()})
+    model_names = list(config.MODEL_NAME_MAP)
+    distinct = args.distinct or args.requests
+    questions = [make_question(i, args.distractors) for i in range(distinct)]
+    headers = {"authorization": f"Bearer: {args.api_key}"}
+
+    latencies: list[float] = []
+    failures = 0
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=backend.app), base_url="http://questions-ui", timeout=None) as app_client:
+        async def request(question: dict) -> bool:
+            if args.scenario == "impl":
+                results = await asyncio.gather(*[
+                    ai.test_question_impl(model, question["question"], question["correct_answer"], question["distractors"], args.api_key)
+                    for model in model_names], return_exceptions=True)
+                return all(isinstance(r, ai.eval_result) and r.correct_log_str != "" for r in results)
+            elif args.scenario == "stream":
+                ok = True
+                async with app_client.stream("POST", "/api/test_question/stream", json=question, headers=headers) as response:
+                    async for line in response.aiter_lines():
+                        if line and "error" in json.loads(line):
+                            ok = False
+                return ok and response.status_code == 200
+            else:
+                response = await app_client.post("/api/test_question", json=question, headers=headers)
+                return response.status_code == 200
+
+        async def worker():
+            nonlocal failures
+            while not queue.empty():
+                i = queue.get_nowait()
+                start = time.perf_counter()
+                if not await request(questions[i % distinct]):
+                    failures += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+
+    if args.llm_url is not None:
+        async with httpx.AsyncClient() as client:
+            stats = mock_vllm.MockStats(**(await client.get(args.llm_url.rstrip("/").removesuffix("/v1") + "/stats")).json())
+    else:
+        stats = mock_vllm.MockStats()
+        for app in mocks.values():
+            stats.requests += app.state.stats.requests
+            stats.prompts += app.state.stats.prompts
+            stats.errors += app.state.stats.errors
+            stats.max_in_flight += app.state.stats.max_in_flight
+    await ai.client_pool.aclose()
+    return summarize(latencies, elapsed, failures, args.requests, stats)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark the question scoring path against a mock vLLM server")
+    parser.add_argument("--scenario", choices=["test_question", "stream", "impl"], default="test_question")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--distinct", type=int, default=0, help="number of distinct questions, 0 for all distinct")
+    parser.add_argument("--distractors", type=int, default=4)
+    parser.add_argument("--models", type=int, default=1, help="number of models in the model map")
+    parser.add_argument("--replicas", type=int, default=1, help="base URLs per model, each served by its own mock")
+    parser.add_argument("--failing-replicas", type=int, default=0, help="replicas that fail every request")
+    parser.add_argument("--no-eval-cache", dest="eval_cache", action="store_false")
+    parser.add_argument("--llm-url", help="use a mock_vllm.py server that is already running, e.g. http://localhost:9000/v1/")
+    parser.add_argument("--api-key", default="benchmark")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    mock_vllm.add_arguments(parser)
+    args = parser.parse_args()
+
+    database = tempfile.NamedTemporaryFile(suffix=".db")
+    os.environ["QUESTIONSUI_SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{database.name}"
+    os.environ["QUESTIONSUI_BACKEND_READY"] = "true"
+    os.environ["QUESTIONSUI_AI_API"] = args.llm_url or BENCHMARK_LLM_URL
+    if args.replicas > 1:
+        os.environ["QUESTIONSUI_MODEL_MAP"] = json.dumps({f"mock-{i}": {"model": f"mock/model-{i}", "base_urls": [replica_url(r) for r in range(args.replicas)]} for i in range(args.models)})
+    else:
+        os.environ["QUESTIONSUI_MODEL_MAP"] = json.dumps({f"mock-{i}": f"mock/model-{i}" for i in range(args.models)})
+    if not args.eval_cache:
+        os.environ["QUESTIONSUI_EVAL_CACHE"] = "false"
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, value in results.items():
+            print(f"{name:>26}: {value}")
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+"""
+Benchmark of the question read endpoints against a generated question bank.
+
+A temporary database is filled with --questions questions, each with
+--distractors distractors, --skills skills, --domains domains and
+--reviews reviews, and the FastAPI app is driven in-process through
+httpx.ASGITransport.
+
+    python benchmark_db.py --scenario list --limit 1000 --requests 20
+
+Scenarios:
+    list       GET /api/question?limit=LIMIT, page --page by skip or by cursor (--pagination)
+    question   GET /api/question/{id}
+    validated  GET /api/reports/validated?validations=1
+    search     GET /api/question/search?q=QUERY&limit=LIMIT
+    batch      POST /api/review_batch?limit=LIMIT&validations=VALIDATIONS for author 1 in three domains
+    needed     GET /api/reports/reviews_needed?validations=VALIDATIONS
+    progress   GET /api/reports/reviewers_progress
+    sprint     --reviewers reviewers of every domain each take a batch of one question and
+               review it after --think-time seconds until every question has
+               VALIDATIONS reviews; reports the time taken and the reviews beyond
+               VALIDATIONS, compare with --no-leases
+
+Besides latency it reports the SQL statements run and the rows they return
+per request; rows are counted by running the statements of one request
+again after the timed run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+# question text is drawn from these words so that searches match a share of the bank
+WORDS = ("argon plasma tokamak neutron lattice quantum gluon catalyst enzyme protein genome climate aerosol "
+         "turbulence combustion battery electrolyte superconductor magnet laser photon detector cosmology galaxy "
+         "supernova neutrino isotope reactor fusion fission polymer membrane solvent crystal semiconductor").split()
+
+def seed(args):
+    import models
+    from sqlalchemy import insert
+    models.Base.metadata.create_all(models.engine)
+    with models.SessionLocal() as db:
+        db.execute(insert(models.Affiliation), [{"id": 1, "name": "benchmark"}])
+        db.execute(insert(models.Position), [{"id": 1, "name": "benchmark"}])
+        db.execute(insert(models.Author), [{"id": i + 1, "name": f"author {i}", "affiliation_id": 1, "position_id": 1} for i in range(10)])
+        db.execute(insert(models.Difficulty), [{"id": i + 1, "name": f"difficulty {i}"} for i in range(3)])
+        db.execute(insert(models.Skill), [{"id": i + 1, "name": f"skill {i}"} for i in range(20)])
+        db.execute(insert(models.Domain), [{"id": i + 1, "name": f"domain {i}"} for i in range(20)])
+        rng = random.Random(0)
+        questions, distractors, skills, domains, reviews = [], [], [], [], []
+        for q in range(1, args.questions + 1):
+            questions.append({"id": q, "question": f"benchmark question {q} on {' '.join(rng.choices(WORDS, k=12))}?", "correct_answer": f"answer {q}: {' '.join(rng.choices(WORDS, k=4))}",
+                              "doi": "", "support": " ".join(rng.choices(WORDS, k=30)), "comments": "",
+                              "difficulty_id": rng.randint(1, 3), "author_id": rng.randint(1, 10)})
+            distractors.extend({"question_id": q, "text": f"distractor {d} of {q}"} for d in range(args.distractors))
+            skills.extend({"question_id": q, "skill_id": s} for s in rng.sample(range(1, 21), args.skills))
+            domains.extend({"question_id": q, "domain_id": d} for d in rng.sample(range(1, 21), args.domains))
+            reviews.extend({"question_id": q, "author_id": rng.randint(1, 10), "comments": "", "accept": True,
+                            **{k: 1 for k in ["questionrelevent", "questionfromarticle", "questionindependence", "questionchallenging", "answerrelevent",
+                                              "answercomplete", "answerfromarticle", "answerunique", "answeruncontroverial", "arithmaticfree",
+                                              "skillcorrect", "domaincorrect"]}} for _ in range(args.reviews))
+        db.execute(insert(models.Question), questions)
+        db.execute(insert(models.Distractor), distractors)
+        db.execute(insert(models.skills_to_questions), skills)
+        db.execute(insert(models.domains_to_questions), domains)
+        if reviews:
+            db.execute(insert(models.Review), reviews)
+        db.commit()
+
+async def sprint(client, args) -> dict:
+    import models
+    from sqlalchemy import insert
+    reviewers = list(range(1001, 1001 + args.reviewers))
+    with models.SessionLocal() as db:
+        db.execute(insert(models.Author), [{"id": i, "name": f"reviewer {i}", "affiliation_id": 1, "position_id": 1} for i in reviewers])
+        db.commit()
+    domains = [f"domain {i}" for i in range(20)]
+    rng = random.Random(0)
+    review = {"comments": "", "accept": True, **{k: 1 for k in ["questionrelevent", "questionfromarticle", "questionindependence", "questionchallenging", "answerrelevent",
+                                                              "answercomplete", "answerfromarticle", "answerunique", "answeruncontroverial", "arithmaticfree",
+                                                              "skillcorrect", "domaincorrect"]}}
+
+    async def reviewer(author_id: int):
+        while True:
+            response = await client.post("/api/review_batch", params={"limit": 1, "validations": args.validations}, json={"author": author_id, "domains": domains})
+            assert response.status_code == 200, response.text
+            if not response.json():
+                return
+            await asyncio.sleep(args.think_time * rng.uniform(0.5, 1.5))
+            response = await client.post("/api/review", json={**review, "author": author_id, "question_id": response.json()[0]})
+            assert response.status_code == 200, response.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*(reviewer(author_id) for author_id in reviewers))
+    elapsed = time.perf_counter() - start
+    database = sqlite3.connect(args.database)
+    counts = [count for count, in database.execute("SELECT count(review.id) FROM question LEFT JOIN review ON review.question_id = question.id GROUP BY question.id")]
+    database.close()
+    return {
+        "seconds": round(elapsed, 2),
+        "think_times": round(elapsed / args.think_time, 1),
+        "reviews": sum(counts),
+        "extra_reviews": sum(max(count - args.validations, 0) for count in counts),
+        "underreviewed_questions": sum(count < args.validations for count in counts),
+    }
+
+async def run(args) -> dict:
+    # imported here so the QUESTIONSUI_ settings from the command line are in place first
+    import httpx
+    import numpy as np
+    from sqlalchemy import event
+    import models
+    import backend
+
+    models.engine.echo = False
+    seed(args)
+    statements: list[tuple[str, tuple]] = []
+    event.listen(models.engine, "before_cursor_execute", lambda conn, cursor, statement, parameters, context, executemany: statements.append((statement, parameters)))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=backend.app), base_url="http://questions-ui", timeout=None) as client:
+        if args.scenario == "sprint":
+            return await sprint(client, args)
+        page = {"limit": args.limit}
+        if args.page and args.pagination == "offset":
+            page["skip"] = args.page * args.limit
+        elif args.page:
+            # follow the cursors to the page, the timed requests then fetch it directly
+            for _ in range(args.page):
+                response = await client.get("/api/question", params=page)
+                page["cursor"] = response.headers["X-Next-Cursor"]
+
+        async def request(i: int):
+            if args.scenario == "list":
+                response = await client.get("/api/question", params=page)
+                assert response.status_code == 200 and len(response.json()) == min(args.limit, args.questions - args.page * args.limit), response.text
+            elif args.scenario == "search":
+                response = await client.get("/api/question/search", params={"q": args.query, "limit": args.limit})
+                assert response.status_code == 200, response.text
+            elif args.scenario == "batch":
+                response = await client.post("/api/review_batch", params={"limit": args.limit, "validations": args.validations},
+                                             json={"author": 1, "domains": ["domain 0", "domain 1", "domain 2"]})
+                assert response.status_code == 200, response.text
+            elif args.scenario == "needed":
+                response = await client.get("/api/reports/reviews_needed", params={"validations": args.validations})
+                assert response.status_code == 200, response.text
+            elif args.scenario == "progress":
+                response = await client.get("/api/reports/reviewers_progress")
+                assert response.status_code == 200, response.text
+            elif args.scenario == "question":
+                response = await client.get(f"/api/question/{i % args.questions + 1}")
+                assert response.status_code == 200, response.text
+            else:
+                response = await client.get("/api/reports/validated", params={"validations": 1})
+                assert response.status_code == 200 and len(response.json()) == (args.questions if args.reviews else 0), response.text
+
+        await request(0) # warm up
+        latencies = []
+        for i in range(args.requests):
+            statements.clear()
+            start = time.perf_counter()
+            await request(i)
+            latencies.append(time.perf_counter() - start)
+
+    database = sqlite3.connect(args.database)
+    rows = sum(database.execute(f"SELECT count(*) FROM ({statement})", parameters).fetchone()[0]
+               for statement, parameters in statements if statement.lstrip().upper().startswith("SELECT"))
+    database.close()
+    lat = np.asarray(latencies)
+    questions = {"list": min(args.limit, args.questions - args.page * args.limit), "question": 1, "validated": args.questions, "search": args.limit, "batch": args.limit, "needed": args.questions, "progress": args.questions}[args.scenario]
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(float(np.percentile(lat, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(lat, 99)) * 1000, 2),
+        "mean_ms": round(float(lat.mean()) * 1000, 2),
+        "statements_per_request": len(statements),
+        "rows_per_request": rows,
+        "rows_per_question": round(rows / questions, 2),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark the question read endpoints")
+    parser.add_argument("--scenario", choices=["list", "question", "validated", "search", "batch", "needed", "progress", "sprint"], default="list")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=1000, help="questions per list or search request")
+    parser.add_argument("--page", type=int, default=0, help="page of the list scenario, from 0")
+    parser.add_argument("--pagination", choices=["offset", "cursor"], default="cursor", help="how the list scenario gets to --page")
+    parser.add_argument("--query", default="quantum gluon", help="search box query of the search scenario")
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--distractors", type=int, default=4)
+    parser.add_argument("--skills", type=int, default=3)
+    parser.add_argument("--domains", type=int, default=3)
+    parser.add_argument("--reviews", type=int, default=1)
+    parser.add_argument("--validations", type=int, default=3, help="reviews a question needs in the batch and sprint scenarios")
+    parser.add_argument("--reviewers", type=int, default=20, help="reviewers in the sprint scenario")
+    parser.add_argument("--think-time", type=float, default=0.05, help="mean seconds a reviewer spends on a question in the sprint scenario")
+    parser.add_argument("--no-leases", action="store_true", help="hand out review batches without leasing them")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    database = tempfile.NamedTemporaryFile(suffix=".db")
+    args.database = database.name
+    os.environ["QUESTIONSUI_SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{database.name}"
+    if args.no_leases:
+        os.environ["QUESTIONSUI_REVIEW_LEASE_TTL"] = "0"
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, value in results.items():
+            print(f"{name:>24}: {value}")
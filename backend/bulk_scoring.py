@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+import argparse
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Callable, Optional
+import openai
+import sqlalchemy.exc
+import config
+from models import SessionLocal, ScoringJob
+from data_access import validated_question_ids, list_questions, create_scoring_job, claim_scoring_job, store_question_scores, update_scoring_job, scoring_failures, stored_answer_logprobs
+from ai import test_question_impl, client_pool, eval_result, BackendOverloadedError, BackendUnavailableError, CassetteMissError
+from scoring import ScoringMethod, SCORING_METHODS, pack_logprobs, rescore
+
+@dataclass
+class ScoringQuestion:
+    id: Optional[int]
+    question: str
+    correct_answer: str
+    distractors: list[str]
+    index: int = 0 # position in the input of evaluate.py
+
+# failures of one model on one question that do not stop the job: the question is
+# retried and then recorded in scoring_failure, to be retried when the job is resumed
+TRANSIENT_ERRORS = (TimeoutError, BackendOverloadedError, BackendUnavailableError, openai.APIConnectionError, openai.InternalServerError, openai.RateLimitError)
+
+# jobs running in this process, so they are not garbage collected and can be cancelled on shutdown
+running_jobs: dict[int, asyncio.Task] = {}
+
+def create_job(models: list[str], validations: int) -> ScoringJob:
+    with SessionLocal() as db:
+        return create_scoring_job(db, models, validations)
+
+def get_job(job_id: int) -> Optional[ScoringJob]:
+    with SessionLocal() as db:
+        return db.query(ScoringJob).get(job_id)
+
+def claim_job(job_id: int) -> Optional[ScoringJob]:
+    """
+    Mark a job as running in this process, None if it does not exist, is complete, or is running elsewhere.
+    """
+    with SessionLocal() as db:
+        return claim_scoring_job(db, job_id, config.SCORING_JOB_STALE_AFTER)
+
+def _remaining(validations: int, checkpoint: int) -> list[int]:
+    with SessionLocal() as db:
+        return validated_question_ids(db, validations, after_id=checkpoint)
+
+def load_questions(ids: list[int]) -> list[ScoringQuestion]:
+    """
+    The questions with the given ids in id order, without those that no longer exist.
+    """
+    with SessionLocal() as db:
+        return [ScoringQuestion(q.id, q.question, q.correct_answer, [d.text for d in q.distractors])
+                for q in list_questions(db, limit=len(ids), ids=ids)]
+
+def _failures(job_id: int) -> list[tuple[int, str]]:
+    with SessionLocal() as db:
+        return scoring_failures(db, job_id)
+
+def _store(job_id: int, scores: list[dict], answer_logprobs: list[dict], failures: list[dict], checkpoint: int, scored: int):
+    with SessionLocal() as db:
+        store_question_scores(db, job_id, scores, checkpoint, scored, answer_logprobs, failures)
+
+def _update(job_id: int, **values):
+    with SessionLocal() as db:
+        update_scoring_job(db, job_id, **values)
+
+def served_models(models: list[str]) -> dict[str, str]:
+    """
+    The served model name of each of models from one snapshot of the model map, raising ValueError for models no longer in it.
+    """
+    model_map = config.MODEL_NAME_MAP
+    if unknown := [m for m in models if m not in model_map]:
+        raise ValueError(f"models {unknown} are not in the model map")
+    return {m: model_map[m] for m in models}
+
+async def score_model(question: ScoringQuestion, model: str, served_model: str, api_key: str) -> eval_result|Exception:
+    """
+    Score a question with a model, retrying TRANSIENT_ERRORS; the last error, or a cassette miss, is returned rather than raised.
+    """
+    for attempt in range(config.BULK_SCORING_RETRIES + 1):
+        if attempt > 0:
+            await asyncio.sleep(config.BULK_SCORING_RETRY_DELAY * 2 ** (attempt - 1))
+        try:
+            return await test_question_impl(model, question.question, question.correct_answer, question.distractors, api_key, with_logprobs=True, served_model=served_model)
+        except TRANSIENT_ERRORS as e:
+            error = e
+        except CassetteMissError as e:
+            # replaying, asking again gives the same answer
+            return e
+    return error
+
+async def score_question(question: ScoringQuestion, models: dict[str, str], api_key: str, semaphore: asyncio.Semaphore) -> tuple[list[dict], list[dict], list[dict]]:
+    """
+    Score a question with each model of models, a map of model to served model name.
+    """
+    async with semaphore:
+        results = await asyncio.gather(*[score_model(question, model, served_model, api_key) for model, served_model in models.items()])
+    failures = [dict(question_id=question.id, model=model, error=repr(r)) for model, r in zip(models, results) if isinstance(r, Exception)]
+    # the model could not score this question (e.g. it is longer than the context window)
+    scored = [(model, r) for model, r in zip(models, results) if isinstance(r, eval_result) and r.correct_log_str != ""]
+    scores = [dict(
+                question_id=question.id,
+                model=model,
+                is_correct=r.is_correct,
+                score=r.score,
+                correct_log_str=r.correct_log_str,
+                incorrect_log_str=r.incorrect_log_str,
+            )
+            for model, r in scored]
+    answer_logprobs = [dict(question_id=question.id, model=model, logprobs=[pack_logprobs(t) for t in r.answer_logprobs])
+                       for model, r in scored]
+    return scores, answer_logprobs, failures
+
+async def _heartbeat(job_id: int, interval: float):
+    """
+    Keep the job's modified time fresh while it runs, so a slow chunk does not let another worker claim it as stale.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_update, job_id)
+        except sqlalchemy.exc.OperationalError:
+            # the database is busy, the next beat will do
+            pass
+
+async def _score_chunk(job_id: int, questions: list[tuple[ScoringQuestion, dict[str, str]]], api_key: str, semaphore: asyncio.Semaphore, checkpoint: int, scored: int):
+    results = await asyncio.gather(*[score_question(q, models, api_key, semaphore) for q, models in questions])
+    scores = [s for question_scores, _, _ in results for s in question_scores]
+    answer_logprobs = [a for _, question_logprobs, _ in results for a in question_logprobs]
+    failures = [f for _, _, question_failures in results for f in question_failures]
+    await asyncio.to_thread(_store, job_id, scores, answer_logprobs, failures, checkpoint, scored)
+
+async def run_scoring_job(
+        job: ScoringJob,
+        api_key: str,
+        concurrency: int = config.BULK_SCORING_CONCURRENCY,
+        chunk_size: int = config.BULK_SCORING_CHUNK_SIZE,
+        progress: Optional[Callable[[int, int], None]] = None,
+        ):
+    """
+    Score the validated questions of a job claimed with claim_job that have not been scored yet.
+
+    Questions are scored in id order, chunk_size at a time with at most
+    concurrency questions in flight.  The scores of a chunk and the new
+    checkpoint are saved together, so a job that is interrupted resumes after
+    the last saved chunk.  Questions a model failed on in an earlier run are
+    scored again first; if some still fail at the end the job is marked
+    failed so that it can be resumed to retry them.  The served model names
+    are resolved when the job starts, so it runs to the end with them even if
+    the model map is reloaded.
+    """
+    job_id = job.id
+    semaphore = asyncio.Semaphore(concurrency)
+    heartbeat = asyncio.create_task(_heartbeat(job_id, config.SCORING_JOB_STALE_AFTER / 4))
+    try:
+        models = served_models(json.loads(job.models))
+        failed: dict[int, list[str]] = {}
+        for question_id, model in await asyncio.to_thread(_failures, job_id):
+            failed.setdefault(question_id, []).append(model)
+        failed_ids = list(failed)
+        for start in range(0, len(failed_ids), chunk_size):
+            questions = await asyncio.to_thread(load_questions, failed_ids[start:start+chunk_size])
+            await _score_chunk(job_id, [(q, {m: models[m] for m in failed[q.id]}) for q in questions], api_key, semaphore, job.checkpoint, 0)
+
+        ids = await asyncio.to_thread(_remaining, job.validations, job.checkpoint)
+        completed, total = job.completed, job.completed + len(ids)
+        await asyncio.to_thread(_update, job_id, total=total)
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start+chunk_size]
+            questions = await asyncio.to_thread(load_questions, chunk)
+            await _score_chunk(job_id, [(q, models) for q in questions], api_key, semaphore, chunk[-1], len(chunk))
+            completed += len(chunk)
+            if progress is not None:
+                progress(completed, total)
+    except asyncio.CancelledError:
+        # shutting down, leave the job to be resumed from its checkpoint
+        await asyncio.to_thread(_update, job_id, status="pending")
+        raise
+    except Exception as e:
+        await asyncio.to_thread(_update, job_id, status="failed", error=repr(e))
+        raise
+    finally:
+        heartbeat.cancel()
+    if (failed_pairs := len(await asyncio.to_thread(_failures, job_id))) > 0:
+        await asyncio.to_thread(_update, job_id, status="failed", error=f"{failed_pairs} question/model pairs could not be scored, resume the job to retry them")
+    else:
+        await asyncio.to_thread(_update, job_id, status="complete")
+
+def rescore_stored(model: str, method: ScoringMethod = "token_normalized", question_ids: Optional[list[int]] = None) -> list[dict]:
+    """
+    Recompute the scores of a model from the token logprobs saved by scoring jobs, without querying the model.
+
+    The stored logprobs are those of the question as it was when it was
+    scored, rescore with a new job after editing questions.
+    """
+    with SessionLocal() as db:
+        rows = stored_answer_logprobs(db, model, question_ids)
+    ids, scores, is_correct = rescore([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], method)
+    return [dict(question_id=int(i), model=model, score=float(s), is_correct=bool(c)) for i, s, c in zip(ids, scores, is_correct)]
+
+def _job_done(job_id: int, task: asyncio.Task):
+    running_jobs.pop(job_id, None)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"scoring job {job_id} stopped: {task.exception()!r}")
+
+def start_scoring_job(job: ScoringJob, api_key: str) -> asyncio.Task:
+    """
+    Run a job claimed with claim_job in the background.
+    """
+    task = asyncio.create_task(run_scoring_job(job, api_key))
+    running_jobs[job.id] = task
+    task.add_done_callback(lambda t: _job_done(job.id, t))
+    return task
+
+async def cancel_running_jobs():
+    tasks = list(running_jobs.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def add_scoring_arguments(parser: argparse.ArgumentParser, validations: int):
+    """
+    The options shared by the command lines of this module and evaluate.py.
+    """
+    parser.add_argument("--models", nargs="+", default=list(config.MODEL_NAME_MAP), choices=list(config.MODEL_NAME_MAP))
+    parser.add_argument("--validations", type=int, default=validations, help="reviews needed for a question from the database to be scored")
+    parser.add_argument("--concurrency", type=int, default=config.BULK_SCORING_CONCURRENCY, help="questions scored at once")
+    parser.add_argument("--api-key", default=config.LLM_API_KEY)
+
+if __name__ == "__main__":
+    import sys
+    from tqdm import tqdm
+    parser = argparse.ArgumentParser(description="score the validated questions against models from QUESTIONSUI_MODEL_MAP")
+    add_scoring_arguments(parser, validations=3)
+    parser.add_argument("--resume", type=int, metavar="JOB_ID", help="continue a previous job from its checkpoint")
+    parser.add_argument("--rescore", choices=SCORING_METHODS, help="print CSV scores recomputed from stored logprobs instead of running a job")
+    args = parser.parse_args()
+
+    if args.rescore is not None:
+        import csv
+        writer = csv.DictWriter(sys.stdout, fieldnames=["question_id", "model", "score", "is_correct"])
+        writer.writeheader()
+        for model in args.models:
+            writer.writerows(rescore_stored(model, args.rescore))
+        sys.exit(0)
+
+    job_id = args.resume if args.resume is not None else create_job(args.models, args.validations).id
+    print(f"scoring job {job_id}")
+    if (job := claim_job(job_id)) is None:
+        sys.exit(f"scoring job {job_id} does not exist, is complete, or is running elsewhere")
+    with tqdm(unit="question") as bar:
+        def report(completed: int, total: int):
+            bar.total = total
+            bar.n = completed
+            bar.refresh()
+        async def main():
+            try:
+                await run_scoring_job(job, args.api_key, concurrency=args.concurrency, progress=report)
+            finally:
+                await client_pool.aclose()
+        asyncio.run(main())
@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import httpx
+import openai
+from dataclasses import dataclass
+from typing import Literal, Optional
+
+# off: always ask the server
+# record: ask the server and save every response
+# replay: answer only from saved responses, a request that was not recorded fails
+# readthrough: answer from saved responses, ask the server and save on a miss
+# Requests the server rejected (HTTP 400 and 422) are saved with their status
+# and replayed as the same openai.APIStatusError.
+CassetteMode = Literal["off", "record", "replay", "readthrough"]
+CASSETTE_MODES: tuple[CassetteMode, ...] = ("off", "record", "replay", "readthrough")
+
+class CassetteMissError(Exception):
+    """
+    A completion request in replay mode that is not in the cassette.
+    """
+
+@dataclass
+class CassetteStats:
+    hits: int = 0
+    misses: int = 0
+    recorded: int = 0
+
+STATUS_ERRORS: dict[int, type[openai.APIStatusError]] = {
+    400: openai.BadRequestError,
+    401: openai.AuthenticationError,
+    403: openai.PermissionDeniedError,
+    404: openai.NotFoundError,
+    409: openai.ConflictError,
+    422: openai.UnprocessableEntityError,
+    429: openai.RateLimitError,
+}
+
+def request_key(request: dict) -> str:
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+def error_response(error: openai.APIStatusError) -> str:
+    return json.dumps({"message": error.message, "body": error.body})
+
+def replayed_error(status: int, response: str) -> openai.APIStatusError:
+    """
+    The error the client raised when the server answered a request with status and a body saved by error_response.
+    """
+    saved = json.loads(response)
+    http_response = httpx.Response(status, json=saved["body"], request=httpx.Request("POST", "http://cassette/completions"))
+    error_class = STATUS_ERRORS.get(status, openai.InternalServerError if status >= 500 else openai.APIStatusError)
+    return error_class(saved["message"], response=http_response, body=saved["body"])
+
+class Cassette:
+    """
+    Completion requests and responses saved in a SQLite file indexed by a hash of the request.
+
+    Lookups are primary key reads on a connection owned by the event loop, so
+    replay needs no network and no thread hop; saves run in a worker thread
+    on a second connection so the loop never waits on a disk sync.  The
+    write-ahead log lets the two connections, and other processes replaying
+    the same file, work at once.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.stats = CassetteStats()
+        self._reader = self._connect()
+        self._writer = self._connect()
+        self._write_lock = threading.Lock()
+        self._writer.execute("""
+            CREATE TABLE IF NOT EXISTS interaction (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                request TEXT NOT NULL,
+                response TEXT NOT NULL,
+                recorded REAL NOT NULL,
+                status INTEGER NOT NULL DEFAULT 200
+            )""")
+        if "status" not in [column for _, column, *_ in self._writer.execute("PRAGMA table_info(interaction)")]:
+            # recorded before errors were saved
+            self._writer.execute("ALTER TABLE interaction ADD COLUMN status INTEGER NOT NULL DEFAULT 200")
+        self._writer.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def get(self, request: dict) -> Optional[tuple[int, str]]:
+        """
+        The HTTP status and response saved for a request, None if it was not recorded.
+        """
+        row = self._reader.execute("SELECT status, response FROM interaction WHERE key = ?", (request_key(request),)).fetchone()
+        if row is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return row[0], row[1]
+
+    def _put(self, request: dict, response: str, status: int):
+        with self._write_lock:
+            self._writer.execute("INSERT OR REPLACE INTO interaction (key, model, request, response, recorded, status) VALUES (?, ?, ?, ?, ?, ?)",
+                                 (request_key(request), request["model"], json.dumps(request), response, time.time(), status))
+            self._writer.commit()
+
+    async def put(self, request: dict, response: str, status: int = 200):
+        await asyncio.to_thread(self._put, request, response, status)
+        self.stats.recorded += 1
+
+    def __len__(self) -> int:
+        return self._reader.execute("SELECT count(*) FROM interaction").fetchone()[0]
+
+    def close(self):
+        self._reader.close()
+        self._writer.close()
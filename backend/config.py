@@ -1,7 +1,50 @@
 import os
 import json
+from model_config import parse_model_map, read_model_config_file
 BACKEND_READY = os.environ.get("QUESTIONSUI_BACKEND_READY", "true").lower() == "true" # Set to True when the LLM API is ready for requests.
 SQLALCHEMY_DATABASE_URL = os.environ.get("QUESTIONSUI_SQLALCHEMY_DATABASE_URL", "sqlite:///db/questions.db")
 LLM_API_BASE_URL = os.environ.get("QUESTIONSUI_AI_API", "https://data-portal-dev.cels.anl.gov/resource_server/sophia/vllm/v1/") # Replace it.
-MODEL_NAME_MAP = json.loads(os.environ.get("QUESTIONSUI_MODEL_MAP", '{"Phi1.5": "microsoft/phi-1_5"}'))
+# display name -> served model name, or -> {"model": served model name, "base_urls": [replica urls]}
+MODEL_NAME_MAP, MODEL_BASE_URLS = parse_model_map(json.loads(os.environ.get("QUESTIONSUI_MODEL_MAP", '{"Phi1.5": "microsoft/phi-1_5"}')), LLM_API_BASE_URL)
+# a JSON file replacing QUESTIONSUI_AI_API and QUESTIONSUI_MODEL_MAP, reloaded by running workers when it changes; see model_config.py
+MODEL_CONFIG_FILE = os.environ.get("QUESTIONSUI_MODEL_CONFIG_FILE", "")
+MODEL_CONFIG_POLL_INTERVAL = float(os.environ.get("QUESTIONSUI_MODEL_CONFIG_POLL_INTERVAL", "2")) # seconds between checks of MODEL_CONFIG_FILE for changes
+ENV_LLM_API_BASE_URL = LLM_API_BASE_URL # used when MODEL_CONFIG_FILE does not set a base_url
+if MODEL_CONFIG_FILE and os.path.exists(MODEL_CONFIG_FILE):
+    LLM_API_BASE_URL, MODEL_NAME_MAP, MODEL_BASE_URLS = read_model_config_file(MODEL_CONFIG_FILE, ENV_LLM_API_BASE_URL)
 EVENT_PASSWORD = os.environ.get("QUESTIONSUI_EVENT_PASSWORD", "anllabstyle")
+CONTEXT_CACHE_SIZE = int(os.environ.get("QUESTIONSUI_CONTEXT_CACHE_SIZE", "4096")) # number of (model, question) context token counts kept in memory
+BATCH_PROMPTS = os.environ.get("QUESTIONSUI_BATCH_PROMPTS", "true").lower() == "true" # Score all answers in one completions request; set to false for servers without list prompts.
+LLM_MAX_CONNECTIONS = int(os.environ.get("QUESTIONSUI_LLM_MAX_CONNECTIONS", "20")) # per (base url, api key) client
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("QUESTIONSUI_LLM_KEEPALIVE_EXPIRY", "60")) # seconds an idle keep-alive connection is held open
+LLM_CLIENT_IDLE_TIMEOUT = float(os.environ.get("QUESTIONSUI_LLM_CLIENT_IDLE_TIMEOUT", "900")) # seconds before an unused client is closed
+EVAL_CACHE = os.environ.get("QUESTIONSUI_EVAL_CACHE", "true").lower() == "true" # Reuse stored results of /api/test_question for unchanged questions.
+EVAL_CACHE_SIZE = int(os.environ.get("QUESTIONSUI_EVAL_CACHE_SIZE", "1024")) # results kept in memory in front of the eval_cache table
+TEST_QUESTION_DEADLINE = float(os.environ.get("QUESTIONSUI_TEST_QUESTION_DEADLINE", "300")) # upper bound in seconds on scoring a question with every model
+DISCONNECT_POLL_INTERVAL = float(os.environ.get("QUESTIONSUI_DISCONNECT_POLL_INTERVAL", "0.5")) # seconds between client disconnect checks
+LLM_CONCURRENCY = int(os.environ.get("QUESTIONSUI_LLM_CONCURRENCY", "8")) # initial concurrent completion requests per model, adapted at runtime
+LLM_CONCURRENCY_MIN = int(os.environ.get("QUESTIONSUI_LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = int(os.environ.get("QUESTIONSUI_LLM_CONCURRENCY_MAX", "64"))
+LLM_QUEUE_SIZE = int(os.environ.get("QUESTIONSUI_LLM_QUEUE_SIZE", "256")) # completion requests allowed to wait per model before failing fast
+LLM_TARGET_LATENCY = float(os.environ.get("QUESTIONSUI_LLM_TARGET_LATENCY", "10")) # seconds; slower completions shrink the concurrency limit
+LLM_API_KEY = os.environ.get("QUESTIONSUI_AI_API_KEY", "") # used by command line tools; web requests use the caller's token
+BULK_SCORING_CONCURRENCY = int(os.environ.get("QUESTIONSUI_BULK_SCORING_CONCURRENCY", "4")) # questions scored at once by a scoring job
+BULK_SCORING_CHUNK_SIZE = int(os.environ.get("QUESTIONSUI_BULK_SCORING_CHUNK_SIZE", "32")) # questions saved per checkpoint
+BULK_SCORING_RETRIES = int(os.environ.get("QUESTIONSUI_BULK_SCORING_RETRIES", "2")) # retries of a question a model timed out on or was unavailable for, before it is recorded as failed
+BULK_SCORING_RETRY_DELAY = float(os.environ.get("QUESTIONSUI_BULK_SCORING_RETRY_DELAY", "5")) # seconds before the first retry, doubled for each retry after it
+SCORING_JOB_STALE_AFTER = float(os.environ.get("QUESTIONSUI_SCORING_JOB_STALE_AFTER", "600")) # seconds without progress before a running job may be claimed again
+CASSETTE_MODE = os.environ.get("QUESTIONSUI_CASSETTE_MODE", "off").lower() # off, record, replay or readthrough; see cassette.py
+CASSETTE_PATH = os.environ.get("QUESTIONSUI_CASSETTE_PATH", "db/cassette.db") # SQLite file holding recorded completions
+EVAL_LEASE_TTL = float(os.environ.get("QUESTIONSUI_EVAL_LEASE_TTL", "300")) # seconds a worker may hold the lease to score a question before others take over
+EVAL_LEASE_POLL_INTERVAL = float(os.environ.get("QUESTIONSUI_EVAL_LEASE_POLL_INTERVAL", "0.25")) # seconds between checks for a result scored by another worker
+REVIEW_LEASE_TTL = float(os.environ.get("QUESTIONSUI_REVIEW_LEASE_TTL", "900")) # seconds a question from a review batch is held for its reviewer, 0 hands out questions without holding them
+LLM_HEALTH_WINDOW = int(os.environ.get("QUESTIONSUI_LLM_HEALTH_WINDOW", "20")) # recent requests per replica used to judge its health
+LLM_EJECT_ERROR_RATE = float(os.environ.get("QUESTIONSUI_LLM_EJECT_ERROR_RATE", "0.5")) # share of failed recent requests that ejects a replica
+LLM_EJECT_MIN_REQUESTS = int(os.environ.get("QUESTIONSUI_LLM_EJECT_MIN_REQUESTS", "5")) # recent requests needed before a replica can be ejected
+LLM_EJECT_TIME = float(os.environ.get("QUESTIONSUI_LLM_EJECT_TIME", "30")) # seconds a replica is ejected for, doubled for each ejection in a row
+LLM_EJECT_MAX_TIME = float(os.environ.get("QUESTIONSUI_LLM_EJECT_MAX_TIME", "300"))
+LLM_REPLICA_RETRIES = int(os.environ.get("QUESTIONSUI_LLM_REPLICA_RETRIES", "2")) # other replicas tried after a failed completion request
+LLM_PROBE_INTERVAL = float(os.environ.get("QUESTIONSUI_LLM_PROBE_INTERVAL", "15")) # seconds between health probes of every replica, 0 disables probing
+LLM_PROBE_TIMEOUT = float(os.environ.get("QUESTIONSUI_LLM_PROBE_TIMEOUT", "5"))
+LLM_PROBE_FAILURES = int(os.environ.get("QUESTIONSUI_LLM_PROBE_FAILURES", "2")) # failed probes in a row before a replica gets no more requests
+INTERN_CACHE_TTL = float(os.environ.get("QUESTIONSUI_INTERN_CACHE_TTL", "600")) # seconds before the cached ids of skills, domains, difficulties, affiliations, positions and AI skill categories are reloaded
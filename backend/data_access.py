@@ -1,30 +1,33 @@
+import base64
+import json
+import random
+import time
 from typing import Optional
 from schemas import CreateAuthorSchema, CreateReviewSchema, CreateQuestionSchema, ReviewerSchema, ContributionsSchema, CreateAiSkillSchema, CreateJustifiedAiSkill
-from models import Author, Affiliation, Review, Question, Skill, Domain, Difficulty, Position, Distractor, Review, domains_to_questions, Skips, AiSkill, AiSkillCategory, ExperimentTurnEvaluation
-from sqlalchemy import or_, and_, text, bindparam, func
-from sqlalchemy.orm import Session, joinedload
+from models import SessionLocal, question_fts, Author, Affiliation, Review, Question, Skill, Domain, Difficulty, Position, Distractor, Review, domains_to_questions, Skips, ReviewQueue, ReviewLease, AiSkill, AiSkillCategory, ExperimentTurnEvaluation, EvalCache, EvalLease, ScoringJob, ScoringFailure, QuestionScore, AnswerLogprobs
+from sqlalchemy import or_, and_, text, bindparam, func, event, select, exists, union_all, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload, selectinload, make_transient_to_detached
+from dataclasses import dataclass
+from config import INTERN_CACHE_TTL, REVIEW_LEASE_TTL
+
+# The create_* and *_or_select_* functions flush so that ids are assigned but
+# leave the commit to the caller, so an API call is written in one transaction.
 
 def create_or_select_skill_category(db: Session, skill_name: str) -> AiSkillCategory:
-    item = db.query(AiSkillCategory).filter(AiSkillCategory.name == skill_name).first()
-    if item is None:
-        item = AiSkillCategory(name=skill_name)
-        db.add(item)
-        db.commit()
-        db.refresh(item)
-    return item
+    return insert_or_select(db, AiSkillCategory, skill_name)
 
 def create_or_select_skill(db: Session, skill: CreateAiSkillSchema) -> AiSkill:
     skill_category = create_or_select_skill_category(db, skill.name).id
     item = db.query(AiSkill).filter(AiSkill.description == skill.description, AiSkill.level == skill.level, AiSkill.skill_category_id == skill_category).first()
     if item is None:
         item = AiSkill(
-            description=skill.name,
+            description=skill.description,
             level=skill.level,
             skill_category_id = skill_category
         )
         db.add(item)
-        db.commit()
-        db.refresh(item)
+        db.flush()
     return item
 
 def create_justified_skill(db: Session, experiment_turn_id: int, just_skill: Optional[CreateJustifiedAiSkill]) -> Optional[int]:
@@ -37,18 +40,83 @@ def create_justified_skill(db: Session, experiment_turn_id: int, just_skill: Opt
         skill_comments = just_skill.justification
     )
     db.add(turn_eval)
-    db.commit()
-    db.refresh(turn_eval)
+    db.flush()
     return turn_eval.id
 
 
+@dataclass
+class InternCacheStats:
+    hits: int = 0
+    misses: int = 0
+    reloads: int = 0
+
+class InternCache:
+    """
+    name -> id of the lookup tables filled by insert_or_select.
+
+    Their rows are never renamed or deleted, so a cached id stays right in
+    every worker; names added by another worker are simply misses here.
+    Ids are cached once the transaction that inserted or found them commits,
+    and a table is reloaded after ttl seconds to pick up edits made to the
+    database by hand.
+    """
+    def __init__(self, ttl: float = INTERN_CACHE_TTL):
+        self.ttl = ttl
+        self.stats = InternCacheStats()
+        self._ids: dict[type, dict[str, int]] = {}
+        self._loaded: dict[type, float] = {}
+
+    def load(self, EntityType):
+        # on a connection of its own, a session could see ids it has not committed yet
+        with SessionLocal() as db:
+            self._ids[EntityType] = {name: id for id, name in db.execute(select(EntityType.id, EntityType.name))}
+        self._loaded[EntityType] = time.monotonic()
+        self.stats.reloads += 1
+
+    def get(self, EntityType, name: str) -> Optional[int]:
+        if time.monotonic() - self._loaded.get(EntityType, float("-inf")) > self.ttl:
+            self.load(EntityType)
+        id = self._ids[EntityType].get(name)
+        if id is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return id
+
+    def put(self, EntityType, name: str, id: int):
+        self._ids.setdefault(EntityType, {})[name] = id
+
+intern_cache = InternCache()
+INTERNED_TYPES = (Skill, Domain, Difficulty, Affiliation, Position, AiSkillCategory)
+
+def prewarm_intern_cache():
+    for EntityType in INTERNED_TYPES:
+        intern_cache.load(EntityType)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _cache_committed_ids(db: Session):
+    for EntityType, name, id in db.info.pop("interned", []):
+        intern_cache.put(EntityType, name, id)
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _forget_uncommitted_ids(db: Session, previous_transaction):
+    db.info.pop("interned", None)
+
 def insert_or_select(db: Session, EntityType, text: str):
-    item = db.query(EntityType).filter(EntityType.name == text).first()
+    id = intern_cache.get(EntityType, text)
+    if id is None:
+        table = EntityType.__table__
+        # another worker may insert the same name at the same time
+        id = db.execute(sqlite_insert(table).values(name=text).on_conflict_do_nothing(index_elements=[table.c.name]).returning(table.c.id)).scalar()
+        if id is None:
+            id = db.execute(select(table.c.id).where(table.c.name == text)).scalar_one()
+        db.info.setdefault("interned", []).append((EntityType, text, id))
+    item = db.identity_map.get(db.identity_key(EntityType, id))
     if item is None:
-        item = EntityType(name=text)
+        # attach the row without loading it
+        item = EntityType(id=id, name=text)
+        make_transient_to_detached(item)
         db.add(item)
-        db.commit()
-        db.refresh(item)
     return item
 
 def create_or_select_author(db: Session, author: CreateAuthorSchema|int) -> Author:
@@ -80,8 +148,7 @@ def create_or_select_author(db: Session, author: CreateAuthorSchema|int) -> Auth
                     position = position
                     )
             db.add(db_author)
-            db.commit()
-            db.refresh(db_author)
+            db.flush()
         return db_author
 def create_question(db: Session, question: CreateQuestionSchema) -> Question:
     db_question = Question(
@@ -97,20 +164,57 @@ def create_question(db: Session, question: CreateQuestionSchema) -> Question:
         author=create_or_select_author(db, question.author),
     )
     db.add(db_question)
-    db.commit()
-    db.refresh(db_question)
+    db.flush()
     return db_question
 
-def list_questions(db: Session, skip: int = 0, limit: int = 100, author_ids: Optional[list[int]] = None, query: Optional[str] = None, ids: Optional[list[int]] = None, domains: Optional[list[int]] = None, validated: Optional[bool] = None) -> list[Question]:
-    q = db.query(Question).options(
-            joinedload(Question.author),
-            joinedload(Question.difficulty),
-            joinedload(Question.distractors),
-            joinedload(Question.skills),
-            joinedload(Question.domains)
-           )
-    if query is not None:
-        q = q.filter(Question.question.ilike(f"%{query}%"))
+# Joining the three collections of a question returns the product of their
+# sizes in rows per question, each is loaded with its own IN query instead.
+QUESTION_LOAD_OPTIONS = (
+    joinedload(Question.author),
+    joinedload(Question.difficulty),
+    selectinload(Question.distractors),
+    selectinload(Question.skills),
+    selectinload(Question.domains),
+)
+
+def encode_cursor(*key) -> str:
+    """
+    An opaque page cursor holding the sort key of the last row of a page.
+    """
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    """
+    The sort key in a cursor from encode_cursor, raising ValueError unless its values have the given types.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor {cursor!r}") from e
+    if not isinstance(key, list) or len(key) != len(types) or not all(type(value) is t for value, t in zip(key, types)):
+        raise ValueError(f"invalid cursor {cursor!r}")
+    return key
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    Turn a search box query into an FTS5 MATCH expression: every word must
+    appear as a word or a word prefix.  None if there are no words to match.
+    """
+    terms = ['"' + term.replace('"', '""') + '"*' for term in query.split()]
+    return " ".join(terms) if terms else None
+
+# bm25 weights of question, correct_answer, support and comments
+QUESTION_FTS_RANK = func.bm25(question_fts.table_valued(), 10.0, 5.0, 1.0, 1.0)
+
+def list_questions(db: Session, skip: int = 0, limit: int = 100, author_ids: Optional[list[int]] = None, query: Optional[str] = None, ids: Optional[list[int]] = None, domains: Optional[list[int]] = None, validated: Optional[bool] = None, after_id: Optional[int] = None) -> list[Question]:
+    """
+    Questions in id order, starting after after_id if given; search_questions ranks by relevance.
+    """
+    q = db.query(Question).options(*QUESTION_LOAD_OPTIONS).order_by(Question.id)
+    if after_id is not None:
+        q = q.filter(Question.id > after_id)
+    if query is not None and (match := match_expression(query)) is not None:
+        q = q.filter(Question.id.in_(select(question_fts.c.rowid).where(question_fts.table_valued().op("MATCH")(match))))
     if author_ids is not None:
         q = q.filter(Question.author_id.in_(author_ids))
     if ids is not None:
@@ -128,6 +232,29 @@ def list_questions(db: Session, skip: int = 0, limit: int = 100, author_ids: Opt
 
     return q.offset(skip).limit(limit).all()
 
+def search_questions(db: Session, query: str, skip: int = 0, limit: int = 20) -> list[tuple[Question, str, float]]:
+    """
+    Questions matching query, best first, with a highlighted snippet of the matching column and the bm25 score (lower is better).
+    """
+    match = match_expression(query)
+    if match is None:
+        return []
+    rank = QUESTION_FTS_RANK.label("rank")
+    # ordered by the label, bm25 is not evaluated a second time for the sort
+    matches = (select(question_fts.c.rowid.label("id"),
+                      rank,
+                      func.snippet(question_fts.table_valued(), -1, "<b>", "</b>", "…", 12).label("snippet"))
+               .where(question_fts.table_valued().op("MATCH")(match))
+               .order_by(rank)
+               .offset(skip).limit(limit)
+               .subquery())
+    rows = (db.query(Question, matches.c.snippet, matches.c.rank)
+            .options(*QUESTION_LOAD_OPTIONS)
+            .join(matches, matches.c.id == Question.id)
+            .order_by(matches.c.rank)
+            .all())
+    return [(question, snippet, rank) for question, snippet, rank in rows]
+
 
 def create_review(db: Session, review: CreateReviewSchema) -> Review:
     r = Review(
@@ -149,48 +276,113 @@ def create_review(db: Session, review: CreateReviewSchema) -> Review:
         accept=review.accept,
     )
     db.add(r)
-    db.commit()
-    db.refresh(r)
+    db.flush()
     return r
 
-def select_review_batch(db: Session, reviewer_schema: ReviewerSchema, limit: Optional[int], validations: int):
-    domain_ids = db.query(Domain.id).filter(Domain.name.in_(reviewer_schema.domains)).subquery().select()
+# SQLite allows at most 500 selects in a UNION ALL
+REVIEW_QUEUE_PARTITIONS_PER_QUERY = 250
+# A question right after a wide gap between pivots follows the random start
+# more often than others; sampling the batch from a window of several times its
+# size evens that out.
+REVIEW_BATCH_WINDOW = 4
+
+def _sample_review_queue(db: Session, candidates, partitions: list[tuple[int, int]], pivot_filter, limit: int) -> list[int]:
+    """
+    The ids of up to limit candidates with the smallest pivots passing
+    pivot_filter.  Each (domain, review count) partition of the review_queue
+    index is in pivot order, so reading its first limit rows is a range scan.
+    """
+    rows = []
+    for i in range(0, len(partitions), REVIEW_QUEUE_PARTITIONS_PER_QUERY):
+        parts = [candidates.where(ReviewQueue.c.domain_id == domain_id, ReviewQueue.c.review_count == review_count, pivot_filter)
+                 .order_by(ReviewQueue.c.pivot).limit(limit).subquery()
+                 for domain_id, review_count in partitions[i:i + REVIEW_QUEUE_PARTITIONS_PER_QUERY]]
+        rows.extend(db.execute(union_all(*(select(part) for part in parts))).all())
+    # a question in several of the domains comes once from each
+    return list(dict.fromkeys(row.question_id for row in sorted(rows, key=lambda row: row.pivot)))[:limit]
+
+def select_review_batch(db: Session, reviewer_schema: ReviewerSchema, limit: Optional[int], validations: int, lease_ttl: float = REVIEW_LEASE_TTL) -> list[int]:
+    """
+    A random batch of questions in the reviewer's domains with fewer than validations reviews.
+
+    Each question of a batch is leased to the reviewer for lease_ttl seconds
+    and counts as a review for everyone else until then, so reviewers asking
+    at the same time get different questions.  The reviewer's own unexpired
+    leases come first.  Commits.  Without a limit every candidate is returned
+    and none is leased.
+    """
+    domain_ids = [domain_id for domain_id, in db.query(Domain.id).filter(Domain.name.in_(reviewer_schema.domains))]
     reviewer = create_or_select_author(db, reviewer_schema.author)
-    skips = db.query(Skips.c.question_id).filter(Skips.c.author_id != reviewer.id).subquery().select()
-    to_review_q = (db.query(Question.id)
-        .outerjoin(Review, Review.question_id == Question.id, full=True)
-        .outerjoin(domains_to_questions, domains_to_questions.c.question_id == Question.id)
-        .filter(
+    now = time.time()
+    leased = (select(func.count()).select_from(ReviewLease)
+              .where(ReviewLease.question_id == ReviewQueue.c.question_id, ReviewLease.author_id != reviewer.id, ReviewLease.expires >= now)
+              .scalar_subquery())
+    candidates = (select(ReviewQueue.c.question_id, ReviewQueue.c.pivot)
+        .join(Question, Question.id == ReviewQueue.c.question_id)
+        .where(
             Question.author_id != reviewer.id,
-            domains_to_questions.c.domain_id.in_(domain_ids),
-            Question.id.not_in(skips)
-            )
-        .group_by(Question.id)
-        .having(func.count(Review.id) < validations)
-        .order_by(func.random())
-    )
-    if limit is not None:
-        to_review_q = to_review_q.limit(limit)
-    return to_review_q.all()
+            ~exists().where(Skips.c.question_id == ReviewQueue.c.question_id, Skips.c.author_id != reviewer.id),
+            ReviewQueue.c.review_count + leased < validations,
+            ))
+    if limit is None:
+        ids = list(dict.fromkeys(db.execute(candidates.where(ReviewQueue.c.domain_id.in_(domain_ids), ReviewQueue.c.review_count < validations)).scalars()))
+        random.shuffle(ids)
+        db.commit()
+        return ids
+    held = list(dict.fromkeys(db.execute(candidates.where(
+        ReviewQueue.c.domain_id.in_(domain_ids),
+        ReviewQueue.c.review_count < validations,
+        ReviewQueue.c.question_id.in_(select(ReviewLease.question_id).where(ReviewLease.author_id == reviewer.id, ReviewLease.expires >= now)),
+        )).scalars()))[:limit]
+    # the questions following a random point of the pivot order, wrapping around
+    partitions = [(domain_id, review_count) for domain_id in domain_ids for review_count in range(max(validations, 0))]
+    window = limit * REVIEW_BATCH_WINDOW
+    start = random.randint(-2**63, 2**63 - 1)
+    ids = _sample_review_queue(db, candidates, partitions, ReviewQueue.c.pivot >= start, window)
+    if len(ids) < window:
+        ids += [question_id for question_id in _sample_review_queue(db, candidates, partitions, ReviewQueue.c.pivot < start, window)
+                if question_id not in ids]
+    rest = [question_id for question_id in ids if question_id not in held]
+    ids = held + random.sample(rest, len(rest))
+    if lease_ttl <= 0:
+        db.commit()
+        return ids[:limit]
+    # the candidates were read in a transaction of their own: in WAL mode a
+    # transaction that read before another one committed a write cannot write
+    db.commit()
+    db.query(ReviewLease).filter(ReviewLease.expires < now).delete(synchronize_session=False)
+    batch = []
+    for question_id in ids:
+        if len(batch) == limit:
+            break
+        if lease_review(db, question_id, reviewer.id, validations, now, now + lease_ttl):
+            batch.append(question_id)
+    db.commit()
+    return batch
+
+def lease_review(db: Session, question_id: int, author_id: int, validations: int, now: float, expires: float) -> bool:
+    """
+    Lease the question to the reviewer unless its reviews and the unexpired leases of others already reach validations.
+    """
+    leased = (select(func.count()).select_from(ReviewLease)
+              .where(ReviewLease.question_id == question_id, ReviewLease.author_id != author_id, ReviewLease.expires >= now)
+              .scalar_subquery())
+    review_count = select(Question.review_count).where(Question.id == question_id).scalar_subquery()
+    result = db.execute(sqlite_insert(ReviewLease)
+        .from_select(["question_id", "author_id", "expires"],
+                     select(literal(question_id), literal(author_id), literal(expires)).where(review_count + leased < validations))
+        .on_conflict_do_update(index_elements=[ReviewLease.question_id, ReviewLease.author_id], set_=dict(expires=expires)))
+    return result.rowcount == 1
+
+def release_review_lease(db: Session, question_id: int, author_id: int):
+    db.query(ReviewLease).filter(ReviewLease.question_id == question_id, ReviewLease.author_id == author_id).delete(synchronize_session=False)
 
 def validated_questions(db: Session, validations: int) -> list[Question]:
     if validations > 0:
-        reviewed = db.query(Review.question_id).group_by(Review.question_id).having(func.count(Review.question_id) >= validations).all()
-        return db.query(Question).options(
-                joinedload(Question.author),
-                joinedload(Question.difficulty),
-                joinedload(Question.distractors),
-                joinedload(Question.skills),
-                joinedload(Question.domains)
-               ).filter(Question.id.in_(reviewed)).all()
+        reviewed = db.query(Review.question_id).group_by(Review.question_id).having(func.count(Review.question_id) >= validations)
+        return db.query(Question).options(*QUESTION_LOAD_OPTIONS).filter(Question.id.in_(reviewed)).all()
     else:
-        return db.query(Question).options(
-                joinedload(Question.author),
-                joinedload(Question.difficulty),
-                joinedload(Question.distractors),
-                joinedload(Question.skills),
-                joinedload(Question.domains)
-               ).all()
+        return db.query(Question).options(*QUESTION_LOAD_OPTIONS).all()
 
 def contributions(db: Session, author_id: int, validations: int = 3) -> ContributionsSchema:
     num_questions: int = (
@@ -211,3 +403,117 @@ def contributions(db: Session, author_id: int, validations: int = 3) -> Contribu
             num_validated=num_validated,
             num_reviews=num_reviews
     )
+
+def get_cached_eval(db: Session, key: str) -> Optional[EvalCache]:
+    return db.query(EvalCache).filter(EvalCache.key == key).first()
+
+def store_cached_eval(db: Session, key: str, model: str, is_correct: bool, score: float, correct_log_str: str, incorrect_log_str: str):
+    values = dict(
+        model=model,
+        is_correct=is_correct,
+        score=score,
+        correct_log_str=correct_log_str,
+        incorrect_log_str=incorrect_log_str,
+        modified=func.current_timestamp(),
+    )
+    # several workers may score the same question at once, the last one wins
+    db.execute(sqlite_insert(EvalCache).values(key=key, **values).on_conflict_do_update(index_elements=[EvalCache.key], set_=values))
+    db.commit()
+
+def acquire_eval_lease(db: Session, key: str, owner: str, ttl: float) -> bool:
+    """
+    Take the lease on scoring key unless another owner holds it and it has not expired.
+    """
+    now = time.time()
+    values = dict(owner=owner, expires=now + ttl)
+    result = db.execute(sqlite_insert(EvalLease).values(key=key, **values).on_conflict_do_update(
+        index_elements=[EvalLease.key], set_=values, where=or_(EvalLease.expires < now, EvalLease.owner == owner)))
+    db.commit()
+    return result.rowcount == 1
+
+def release_eval_lease(db: Session, key: str, owner: str):
+    db.query(EvalLease).filter(EvalLease.key == key, EvalLease.owner == owner).delete(synchronize_session=False)
+    db.commit()
+
+def eval_lease_held(db: Session, key: str) -> bool:
+    return db.query(EvalLease.key).filter(EvalLease.key == key, EvalLease.expires >= time.time()).first() is not None
+
+def validated_question_ids(db: Session, validations: int, after_id: int = 0) -> list[int]:
+    q = db.query(Question.id).filter(Question.id > after_id)
+    if validations > 0:
+        reviewed = db.query(Review.question_id).group_by(Review.question_id).having(func.count(Review.question_id) >= validations)
+        q = q.filter(Question.id.in_(reviewed))
+    return [i for (i,) in q.order_by(Question.id).all()]
+
+def create_scoring_job(db: Session, models: list[str], validations: int) -> ScoringJob:
+    job = ScoringJob(models=json.dumps(models), validations=validations)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def claim_scoring_job(db: Session, job_id: int, stale_after: float) -> Optional[ScoringJob]:
+    """
+    Mark a job as running unless another process is already running it.
+
+    A running job whose progress has not been updated for stale_after seconds
+    is assumed to belong to a process that died and may be claimed again.
+    """
+    claimed = (db.query(ScoringJob)
+        .filter(ScoringJob.id == job_id,
+                ScoringJob.status != "complete",
+                or_(ScoringJob.status != "running",
+                    ScoringJob.modified < func.datetime("now", f"-{int(stale_after)} seconds")))
+        .update({"status": "running", "error": "", "modified": func.current_timestamp()}, synchronize_session=False))
+    db.commit()
+    if claimed != 1:
+        return None
+    return db.query(ScoringJob).get(job_id)
+
+def store_question_scores(db: Session, job_id: int, scores: list[dict], checkpoint: int, scored: int, answer_logprobs: Optional[list[dict]] = None, failures: Optional[list[dict]] = None):
+    """
+    Save the scores of one chunk of questions and advance the job checkpoint in the same transaction.
+
+    answer_logprobs holds dicts of question_id, model and logprobs, a list of
+    packed token logprobs per answer, replacing what was stored before for that
+    question and model.  failures holds dicts of question_id, model and error
+    for the pairs that could not be scored; a score clears the failure of its pair.
+    """
+    for score in scores:
+        values = dict(score, job_id=job_id, modified=func.current_timestamp())
+        db.execute(sqlite_insert(QuestionScore).values(**values).on_conflict_do_update(index_elements=[QuestionScore.question_id, QuestionScore.model], set_=values))
+        db.query(ScoringFailure).filter(ScoringFailure.job_id == job_id, ScoringFailure.question_id == score["question_id"], ScoringFailure.model == score["model"]).delete(synchronize_session=False)
+    for failure in failures or []:
+        values = dict(failure, job_id=job_id, modified=func.current_timestamp())
+        db.execute(sqlite_insert(ScoringFailure).values(**values).on_conflict_do_update(index_elements=[ScoringFailure.job_id, ScoringFailure.question_id, ScoringFailure.model], set_=values))
+    for answers in answer_logprobs or []:
+        db.query(AnswerLogprobs).filter(AnswerLogprobs.question_id == answers["question_id"], AnswerLogprobs.model == answers["model"]).delete(synchronize_session=False)
+        db.execute(sqlite_insert(AnswerLogprobs), [
+            dict(question_id=answers["question_id"], model=answers["model"], answer_index=i, logprobs=blob)
+            for i, blob in enumerate(answers["logprobs"])])
+    db.query(ScoringJob).filter(ScoringJob.id == job_id).update({
+        "checkpoint": checkpoint,
+        "completed": ScoringJob.completed + scored,
+        "failed": select(func.count(ScoringFailure.id)).where(ScoringFailure.job_id == job_id).scalar_subquery(),
+        "modified": func.current_timestamp(),
+    }, synchronize_session=False)
+    db.commit()
+
+def scoring_failures(db: Session, job_id: int) -> list[tuple[int, str]]:
+    """
+    Return (question_id, model) of every pair a job could not score, by question id.
+    """
+    return [(q, m) for q, m in db.query(ScoringFailure.question_id, ScoringFailure.model).filter(ScoringFailure.job_id == job_id).order_by(ScoringFailure.question_id, ScoringFailure.model)]
+
+def stored_answer_logprobs(db: Session, model: str, question_ids: Optional[list[int]] = None) -> list[tuple[int, int, bytes]]:
+    """
+    Return (question_id, answer_index, logprobs) for every stored answer of a model.
+    """
+    query = db.query(AnswerLogprobs.question_id, AnswerLogprobs.answer_index, AnswerLogprobs.logprobs).filter(AnswerLogprobs.model == model)
+    if question_ids is not None:
+        query = query.filter(AnswerLogprobs.question_id.in_(question_ids))
+    return [tuple(row) for row in query.order_by(AnswerLogprobs.question_id, AnswerLogprobs.answer_index)]
+
+def update_scoring_job(db: Session, job_id: int, **values):
+    db.query(ScoringJob).filter(ScoringJob.id == job_id).update(dict(values, modified=func.current_timestamp()), synchronize_session=False)
+    db.commit()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""
+Score questions from a JSONL file or the database against many models.
+
+Each JSONL line is an object with question, correct_answer and distractors
+(or incorrect_answers), and optionally an id.  One result row is written per
+question and model, in input order and flushed after every question, so a
+sweep that is stopped can be restarted with --resume (or --offset N to skip
+the first N questions).  Questions from the database are read in id order and
+a resumed sweep continues after the id of the last question written, so
+questions validated in between are picked up if their id comes later.
+
+    QUESTIONSUI_MODEL_MAP='{"llama2-7b": "meta-llama/Llama-2-7b-hf"}' \\
+        python evaluate.py --jsonl questions.jsonl --output results.jsonl --concurrency 16
+    python evaluate.py --db --validations 3 --output results.csv --resume
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+from collections import deque
+from typing import Iterator, Optional, TextIO
+import models
+from models import SessionLocal
+from data_access import validated_question_ids
+from ai import test_question_impl, client_pool, continuation_loglikelihood
+from bulk_scoring import ScoringQuestion, load_questions, add_scoring_arguments
+from scoring import SCORING_METHODS, ScoringMethod, score_batch
+
+FIELDS = ["index", "id", "model", "correct", "score", "correct_loglikelihood", "incorrect_loglikelihoods", "error"]
+
+def read_jsonl(path: str, offset: int = 0) -> Iterator[ScoringQuestion]:
+    with (sys.stdin if path == "-" else open(path)) as f:
+        for index, line in enumerate(line for line in f if line.strip()):
+            if index < offset:
+                continue
+            record = json.loads(line)
+            yield ScoringQuestion(record.get("id"), record["question"], record["correct_answer"], record.get("distractors", record.get("incorrect_answers", [])), index)
+
+def read_db(validations: int, offset: int = 0, after_id: int = 0, first_index: int = 0, page_size: int = 256) -> Iterator[ScoringQuestion]:
+    """
+    The validated questions with an id above after_id in id order, skipping the first offset of them.
+    """
+    with SessionLocal() as db:
+        ids = validated_question_ids(db, validations, after_id=after_id)[offset:]
+    index = first_index
+    for start in range(0, len(ids), page_size):
+        for question in load_questions(ids[start:start+page_size]):
+            question.index = index
+            index += 1
+            yield question
+
+async def score(question: ScoringQuestion, model: str, api_key: str, method: ScoringMethod) -> dict:
+    row = dict(index=question.index, id=question.id, model=model, correct=None, score=None, correct_loglikelihood=None, incorrect_loglikelihoods=None, error="")
+    try:
+        # the eval cache only holds token_normalized scores, other methods need the logprobs
+        result = await test_question_impl(model, question.question, question.correct_answer, question.distractors, api_key, with_logprobs=method != "token_normalized")
+    except Exception as e:
+        # timeouts, overload and server errors are recorded so the sweep carries on
+        row["error"] = repr(e)
+        return row
+    if result.correct_log_str == "":
+        row["error"] = "rejected by the model"
+        return row
+    if method != "token_normalized":
+        means, counts = zip(*[continuation_loglikelihood(t) for t in result.answer_logprobs])
+        scores, is_correct = score_batch([means], [counts], method)
+        result.score, result.is_correct = float(scores[0]), bool(is_correct[0])
+    row.update(correct=result.is_correct, score=result.score, correct_loglikelihood=float(result.correct_log_str), incorrect_loglikelihoods=result.incorrect_log_str)
+    return row
+
+class Writer:
+    def __init__(self, out: TextIO, format: str, header: bool):
+        self.out = out
+        self.format = format
+        if format == "csv":
+            self.csv = csv.DictWriter(out, fieldnames=FIELDS)
+            if header:
+                self.csv.writeheader()
+
+    def write(self, rows: list[dict]):
+        if self.format == "csv":
+            self.csv.writerows(rows)
+        else:
+            self.out.writelines(json.dumps(r) + "\n" for r in rows)
+        self.out.flush()
+
+def resume_point(path: str, format: str, rows_per_question: int) -> Optional[dict]:
+    """
+    The last row of the last question written in full to an output file, None if there is none.
+
+    A sweep killed while writing leaves an incomplete last line, or only some
+    of the rows of its last question; they are cut off the file so that the
+    question is scored again.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb+") as f:
+        lines = f.read().splitlines(keepends=True)
+        if lines and not lines[-1].endswith(b"\n"):
+            lines.pop()
+        end = 0
+        if format == "csv":
+            if not lines:
+                return None
+            fields = next(csv.reader([lines[0].decode()]))
+            end = len(lines.pop(0))
+        # (row, offset of the end of its line) of every complete row
+        rows: list[tuple[dict, int]] = []
+        for line in lines:
+            end += len(line)
+            if not line.strip():
+                continue
+            row = dict(zip(fields, next(csv.reader([line.decode()])))) if format == "csv" else json.loads(line)
+            rows.append((row, end))
+        if rows:
+            last_index = rows[-1][0]["index"]
+            written = sum(1 for row, _ in rows[-rows_per_question:] if row["index"] == last_index)
+            if written < rows_per_question:
+                del rows[-written:]
+        f.truncate(rows[-1][1] if rows else end)
+    return rows[-1][0] if rows else None
+
+async def evaluate(questions: Iterator[ScoringQuestion], model_names: list[str], api_key: str, writer: Writer, concurrency: int, method: ScoringMethod, progress=None):
+    """
+    Score questions with at most concurrency in flight and write their rows in input order.
+
+    Questions are read ahead by a bounded window, so the input is streamed
+    rather than loaded, and a slow question only holds back output, not
+    scoring, until the window is full.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def score_all(question: ScoringQuestion) -> list[dict]:
+        async with semaphore:
+            return await asyncio.gather(*[score(question, model, api_key, method) for model in model_names])
+
+    window: deque[asyncio.Task[list[dict]]] = deque()
+    try:
+        for question in questions:
+            window.append(asyncio.create_task(score_all(question)))
+            while len(window) >= concurrency * 4 or (window and window[0].done()):
+                writer.write(await window.popleft())
+                if progress is not None:
+                    progress()
+        while window:
+            writer.write(await window.popleft())
+            if progress is not None:
+                progress()
+    finally:
+        for task in window:
+            task.cancel()
+        await asyncio.gather(*window, return_exceptions=True)
+
+if __name__ == "__main__":
+    from tqdm import tqdm
+    parser = argparse.ArgumentParser(description="score questions against models from QUESTIONSUI_MODEL_MAP")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--jsonl", metavar="PATH", help="questions to score, - for stdin")
+    source.add_argument("--db", action="store_true", help="score the questions in the database")
+    add_scoring_arguments(parser, validations=0)
+    parser.add_argument("--method", choices=SCORING_METHODS, default="token_normalized")
+    parser.add_argument("--output", default="-", help="results file, .csv for CSV otherwise JSONL; - for stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"])
+    parser.add_argument("--offset", type=int, default=0, help="skip the first questions of the input")
+    parser.add_argument("--resume", action="store_true", help="append to --output, skipping the questions it already has")
+    args = parser.parse_args()
+
+    # the SQL log would be mixed into results written to stdout
+    models.engine.echo = False
+    format = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+    offset, after_id, first_index = args.offset, 0, args.offset
+    resumed = False
+    if args.resume:
+        if args.output == "-":
+            parser.error("--resume needs --output")
+        if (last := resume_point(args.output, format, len(args.models))) is not None:
+            first_index, resumed = int(last["index"]) + 1, True
+            # positions in the database change as questions are validated, ids do not
+            offset, after_id = (first_index, 0) if args.jsonl is not None else (0, int(last["id"]))
+    questions = read_jsonl(args.jsonl, offset) if args.jsonl is not None else read_db(args.validations, offset, after_id, first_index)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "a" if resumed else "w", newline="" if format == "csv" else None)
+    with out, tqdm(unit="question", initial=first_index, disable=args.output == "-") as bar:
+        writer = Writer(out, format, header=not resumed)
+        async def main():
+            try:
+                await evaluate(questions, args.models, args.api_key, writer, args.concurrency, args.method, progress=bar.update)
+            finally:
+                await client_pool.aclose()
+        asyncio.run(main())
@@ -0,0 +1,58 @@
+import asyncio
+import time
+import openai
+from dataclasses import dataclass
+import config
+from ai import client_pool, replicas_for
+from balancer import ProbeResult, Replica, ReplicaSet
+from config import LLM_API_KEY, LLM_PROBE_INTERVAL, LLM_PROBE_TIMEOUT
+
+@dataclass
+class ProberStats:
+    rounds: int = 0
+    errors: int = 0 # rounds that failed with an unexpected error, the prober carries on
+
+prober_stats = ProberStats()
+
+async def probe(replica: Replica) -> ProbeResult:
+    """
+    List the models served at the replica's base URL.
+
+    Any answer from the server other than a server error counts as up: the
+    probe uses LLM_API_KEY, which may not be accepted where requests are made
+    with each user's token, but a server that rejects it is still serving.
+    """
+    start = time.monotonic()
+    try:
+        async with client_pool.client(replica.base_url, LLM_API_KEY or "probe") as llm_client:
+            await llm_client.with_options(max_retries=0, timeout=LLM_PROBE_TIMEOUT).models.list()
+    except openai.APIStatusError as e:
+        if e.status_code >= 500:
+            return ProbeResult(False, time.monotonic() - start, time.time(), f"HTTP {e.status_code}")
+    except openai.APIError as e:
+        return ProbeResult(False, time.monotonic() - start, time.time(), repr(e))
+    return ProbeResult(True, time.monotonic() - start, time.time())
+
+async def probe_all() -> list[ReplicaSet]:
+    replica_sets = [replicas_for(model) for model in dict.fromkeys(config.MODEL_NAME_MAP.values())]
+    pairs = [(replicas, replica) for replicas in replica_sets for replica in replicas.replicas]
+    results = await asyncio.gather(*(probe(replica) for _, replica in pairs), return_exceptions=True)
+    for (replicas, replica), result in zip(pairs, results):
+        if isinstance(result, BaseException):
+            # a probe that broke did not see the replica serving
+            result = ProbeResult(False, 0.0, time.time(), repr(result))
+        replicas.probed(replica, result)
+    return replica_sets
+
+async def run_prober(interval: float = LLM_PROBE_INTERVAL):
+    """
+    Probe every replica every interval seconds until cancelled.
+    """
+    while True:
+        try:
+            await probe_all()
+        except Exception as e:
+            prober_stats.errors += 1
+            print(f"health probes failed: {e!r}")
+        prober_stats.rounds += 1
+        await asyncio.sleep(interval)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+"""
+A deterministic stand-in for the vLLM OpenAI compatible completions server.
+
+Only what the scoring path uses is implemented: POST /v1/completions with
+echo, logprobs, max_tokens=0 and list prompts.  Text is split into tokens of
+at most chars_per_token characters (whitespace is kept with the following
+word, so a prompt's tokens always start with the tokens of any prefix ending
+on a word boundary), and each token gets a logprob derived from a hash of the
+model, the token and its position, so repeated runs return identical scores.
+
+Latency, errors and the context window are configurable to reproduce a slow
+or unreliable backend.
+
+    python mock_vllm.py --port 9000 --latency lognormal --latency-mean 0.2 --error-rate 0.01
+"""
+import asyncio
+import hashlib
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Literal, Optional, Union
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+LatencyDistribution = Literal["constant", "uniform", "exponential", "lognormal"]
+
+@dataclass
+class MockConfig:
+    latency: LatencyDistribution = "constant"
+    latency_mean: float = 0.0 # seconds per request
+    latency_sigma: float = 0.5 # spread of the uniform (+/- seconds) and lognormal (shape) distributions
+    latency_per_token: float = 0.0 # seconds added per prompt token, models prefill cost
+    error_rate: float = 0.0 # fraction of requests that fail with error_status
+    error_status: int = 500
+    chars_per_token: int = 4
+    max_model_len: int = 2048 # prompts with more tokens are rejected with 400 like vLLM does
+    list_prompts: bool = True # set to false to emulate a server that rejects a list of prompts
+    max_concurrency: int = 0 # requests processed at once, later ones queue; 0 for no limit
+    seed: int = 0
+
+@dataclass
+class MockStats:
+    requests: int = 0
+    prompts: int = 0
+    errors: int = 0
+    tokens: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    models: dict[str, int] = field(default_factory=dict)
+
+class CompletionRequest(BaseModel):
+    model: str
+    prompt: Union[str, list[str]]
+    max_tokens: Optional[int] = 16
+    echo: bool = False
+    logprobs: Optional[int] = None
+    temperature: Optional[float] = None
+
+_TOKEN = re.compile(r"\s*\S+|\s+$")
+
+def tokenize(text: str, chars_per_token: int) -> list[str]:
+    tokens = []
+    for word in _TOKEN.findall(text):
+        tokens.extend(word[i:i+chars_per_token] for i in range(0, len(word), chars_per_token))
+    return tokens
+
+def token_logprob(model: str, position: int, token: str) -> float:
+    digest = hashlib.blake2b(f"{model}\0{position}\0{token}".encode(), digest_size=4).digest()
+    return -8.0 * int.from_bytes(digest, "little") / 2**32
+
+def create_app(config: MockConfig = MockConfig()) -> FastAPI:
+    app = FastAPI()
+    app.state.config = config
+    app.state.stats = MockStats()
+    rng = random.Random(config.seed)
+    capacity = asyncio.Semaphore(config.max_concurrency) if config.max_concurrency > 0 else None
+
+    def latency(num_tokens: int) -> float:
+        if config.latency == "constant":
+            base = config.latency_mean
+        elif config.latency == "uniform":
+            base = rng.uniform(config.latency_mean - config.latency_sigma, config.latency_mean + config.latency_sigma)
+        elif config.latency == "exponential":
+            base = rng.expovariate(1 / config.latency_mean) if config.latency_mean > 0 else 0.0
+        else:
+            # lognormal with the requested mean
+            base = config.latency_mean * rng.lognormvariate(-config.latency_sigma**2 / 2, config.latency_sigma)
+        return max(0.0, base) + config.latency_per_token * num_tokens
+
+    def error(status: int, message: str) -> JSONResponse:
+        return JSONResponse(status_code=status, content={"object": "error", "message": message, "type": "BadRequestError" if status == 400 else "ServerError", "param": None, "code": status})
+
+    @app.post("/v1/completions")
+    async def completions(request: CompletionRequest):
+        stats: MockStats = app.state.stats
+        stats.requests += 1
+        stats.models[request.model] = stats.models.get(request.model, 0) + 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        try:
+            if isinstance(request.prompt, list) and not config.list_prompts:
+                stats.errors += 1
+                return error(400, "list prompts are not supported")
+            prompts = request.prompt if isinstance(request.prompt, list) else [request.prompt]
+            stats.prompts += len(prompts)
+            tokenized = [tokenize(p, config.chars_per_token) for p in prompts]
+            num_tokens = sum(len(t) for t in tokenized)
+            stats.tokens += num_tokens
+            if capacity is not None:
+                async with capacity:
+                    await asyncio.sleep(latency(num_tokens))
+            else:
+                await asyncio.sleep(latency(num_tokens))
+            if rng.random() < config.error_rate:
+                stats.errors += 1
+                return error(config.error_status, "injected failure")
+            if (longest := max(len(t) for t in tokenized)) > config.max_model_len:
+                stats.errors += 1
+                return error(400, f"This model's maximum context length is {config.max_model_len} tokens. However, you requested {longest} tokens in the messages")
+            choices = []
+            for index, (prompt, tokens) in enumerate(zip(prompts, tokenized)):
+                offsets = []
+                offset = 0
+                for t in tokens:
+                    offsets.append(offset)
+                    offset += len(t)
+                choices.append({
+                    "index": index,
+                    "text": prompt if request.echo else "",
+                    "finish_reason": "length",
+                    "logprobs": {
+                        "tokens": tokens,
+                        # the first token has nothing to be conditioned on
+                        "token_logprobs": [None] + [token_logprob(request.model, i, t) for i, t in enumerate(tokens) if i > 0],
+                        "top_logprobs": None,
+                        "text_offset": offsets,
+                    } if request.logprobs is not None else None,
+                })
+            return {
+                "id": f"cmpl-{stats.requests}",
+                "object": "text_completion",
+                "created": int(time.time()),
+                "model": request.model,
+                "choices": choices,
+                "usage": {"prompt_tokens": num_tokens, "completion_tokens": 0, "total_tokens": num_tokens},
+            }
+        finally:
+            stats.in_flight -= 1
+
+    @app.get("/v1/models")
+    def list_models():
+        return {"object": "list", "data": [{"id": model, "object": "model"} for model in app.state.stats.models]}
+
+    @app.get("/stats")
+    def get_stats():
+        return app.state.stats
+
+    return app
+
+def add_arguments(parser):
+    defaults = MockConfig()
+    parser.add_argument("--latency", choices=["constant", "uniform", "exponential", "lognormal"], default=defaults.latency)
+    parser.add_argument("--latency-mean", type=float, default=defaults.latency_mean, help="seconds per request")
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument("--latency-per-token", type=float, default=defaults.latency_per_token, help="seconds per prompt token")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument("--chars-per-token", type=int, default=defaults.chars_per_token)
+    parser.add_argument("--max-model-len", type=int, default=defaults.max_model_len)
+    parser.add_argument("--no-list-prompts", dest="list_prompts", action="store_false")
+    parser.add_argument("--max-concurrency", type=int, default=defaults.max_concurrency, help="requests processed at once, 0 for no limit")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+def config_from_arguments(args) -> MockConfig:
+    return MockConfig(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_sigma=args.latency_sigma,
+        latency_per_token=args.latency_per_token,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        chars_per_token=args.chars_per_token,
+        max_model_len=args.max_model_len,
+        list_prompts=args.list_prompts,
+        max_concurrency=args.max_concurrency,
+        seed=args.seed,
+    )
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+    parser = argparse.ArgumentParser(description="mock vLLM completions server for benchmarks")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9000)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_arguments(args)), host=args.host, port=args.port)
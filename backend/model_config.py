@@ -0,0 +1,103 @@
+"""
+The model map, and reloading it from QUESTIONSUI_MODEL_CONFIG_FILE while the workers run.
+
+The file holds the base URL and the model map that would otherwise come
+from QUESTIONSUI_AI_API and QUESTIONSUI_MODEL_MAP:
+
+    {"base_url": "http://gpu01:8000/v1/",
+     "models": {"Phi1.5": "microsoft/phi-1_5",
+                "Llama": {"model": "meta-llama/Llama-3-8B", "base_urls": ["http://gpu02:8000/v1/", "http://gpu03:8000/v1/"]}}}
+
+Every worker polls the file and swaps in a changed, valid map between two
+event loop steps; an invalid file is reported and ignored.  Replace the file
+with a rename (write a temporary file, then mv) so a worker never reads half
+of it.
+"""
+import asyncio
+import json
+import os
+from typing import Optional
+
+def parse_model_map(model_config, default_base_url: str) -> tuple[dict[str, str], dict[str, list[str]]]:
+    """
+    Split a model map into display name -> served model name and display name -> base URLs, raising ValueError if it is malformed.
+    """
+    if not isinstance(model_config, dict) or not model_config:
+        raise ValueError("the model map must be a non-empty JSON object")
+    name_map, base_urls = {}, {}
+    for name, entry in model_config.items():
+        if isinstance(entry, str):
+            entry = {"model": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("model"), str) or not entry["model"]:
+            raise ValueError(f"model {name!r} must map to a served model name or to {{\"model\": ..., \"base_urls\": [...]}}")
+        urls = entry.get("base_urls", [default_base_url])
+        if not isinstance(urls, list) or not urls or not all(isinstance(url, str) and url.startswith(("http://", "https://")) for url in urls):
+            raise ValueError(f"base_urls of model {name!r} must be a non-empty list of http(s) URLs")
+        name_map[name] = entry["model"]
+        base_urls[name] = urls
+    return name_map, base_urls
+
+def read_model_config_file(path: str, default_base_url: str) -> tuple[str, dict[str, str], dict[str, list[str]]]:
+    with open(path) as f:
+        contents = json.load(f)
+    if not isinstance(contents, dict) or "models" not in contents:
+        raise ValueError(f"{path} must be a JSON object with a \"models\" model map")
+    base_url = contents.get("base_url", default_base_url)
+    if not isinstance(base_url, str) or not base_url.startswith(("http://", "https://")):
+        raise ValueError(f"base_url in {path} must be an http(s) URL")
+    return (base_url, *parse_model_map(contents["models"], base_url))
+
+def apply_model_config(base_url: str, name_map: dict[str, str], base_urls: dict[str, list[str]]):
+    """
+    Swap in a new model map.  Requests that already resolved their model keep using it.
+    """
+    # imported here, config imports this module
+    import config
+    import ai
+    config.LLM_API_BASE_URL, config.MODEL_NAME_MAP, config.MODEL_BASE_URLS = base_url, name_map, base_urls
+    ai.update_replicas()
+
+def _file_version(path: str) -> Optional[tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+async def watch_model_config(path: str, interval: float):
+    """
+    Apply the model config file whenever it changes, until cancelled.
+    """
+    version = _file_version(path)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            version = await _reload_if_changed(path, version)
+        except Exception as e:
+            # a watcher that stopped would leave the workers on this map until they restart
+            print(f"reloading {path} failed, keeping the current model map: {e!r}")
+
+async def _reload_if_changed(path: str, version: Optional[tuple[int, int]]) -> Optional[tuple[int, int]]:
+    """
+    Apply the model config file if its version differs from version, and return its current version.
+    """
+    import config
+    import health
+    if (current := _file_version(path)) == version:
+        return version
+    if current is None:
+        print(f"{path} was removed, keeping the current model map")
+        return current
+    try:
+        loaded = await asyncio.to_thread(read_model_config_file, path, config.ENV_LLM_API_BASE_URL)
+    except (OSError, ValueError) as e:
+        print(f"ignoring invalid {path}, keeping the current model map: {e}")
+        return current
+    if loaded == (config.LLM_API_BASE_URL, config.MODEL_NAME_MAP, config.MODEL_BASE_URLS):
+        return current
+    apply_model_config(*loaded)
+    print(f"reloaded {path}: {', '.join(config.MODEL_NAME_MAP)}")
+    if config.LLM_PROBE_INTERVAL > 0 and config.CASSETTE_MODE != "replay":
+        # know the health of new replicas before they get requests, and open their connections
+        await health.probe_all()
+    return current
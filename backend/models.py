@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import create_engine, Table, ForeignKey, Column, func, DateTime, UniqueConstraint
+from sqlalchemy import create_engine, event, Table, ForeignKey, Column, func, DateTime, UniqueConstraint, LargeBinary, MetaData, Integer, String, DDL, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, sessionmaker, relationship, mapped_column
 from typing import List,Optional
 from config import SQLALCHEMY_DATABASE_URL
@@ -7,19 +7,30 @@ from config import SQLALCHEMY_DATABASE_URL
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, echo=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # in the default rollback journal every write blocks all readers, so
+        # concurrent scoring requests queue behind eval cache writes; with a
+        # write-ahead log readers and the writer proceed together
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 class Base(DeclarativeBase):
     pass
 
 skills_to_questions = Table("skills_to_questions",
                             Base.metadata,
                             Column("skill_id", ForeignKey("skill.id"), primary_key=True),
-                            Column("question_id", ForeignKey("question.id"), primary_key=True)
+                            Column("question_id", ForeignKey("question.id"), primary_key=True, index=True)
                             )
 
 domains_to_questions = Table("domains_to_questions",
                             Base.metadata,
                             Column("domain_id", ForeignKey("domain.id"), primary_key=True),
-                            Column("question_id", ForeignKey("question.id"), primary_key=True)
+                            Column("question_id", ForeignKey("question.id"), primary_key=True, index=True)
                             )
 
 Skips = Table("skips",
@@ -27,7 +38,45 @@ Skips = Table("skips",
                             Column("author_id", ForeignKey("author.id"), primary_key=True),
                             Column("question_id", ForeignKey("question.id"), primary_key=True),
                             Column("modified", DateTime, default=func.now(), nullable=False),
-                            UniqueConstraint('question_id', 'author_id')
+                            UniqueConstraint('question_id', 'author_id'),
+                            Index("ix_skips_author_id_modified", "author_id", "modified"),
+                            )
+
+# One row per domain of a question with its review count, so that a batch for
+# reviewers of some domains is read from an index instead of grouping all
+# reviews.  pivot is a random number shared by the rows of a question, drawn
+# again whenever its review count changes: a batch is the questions following
+# a random pivot.  Kept up to date by the triggers in REVIEW_QUEUE_DDL.
+ReviewQueue = Table("review_queue",
+                            Base.metadata,
+                            Column("question_id", ForeignKey("question.id"), primary_key=True),
+                            Column("domain_id", ForeignKey("domain.id"), primary_key=True),
+                            Column("review_count", Integer, nullable=False),
+                            Column("pivot", Integer, nullable=False),
+                            Index("ix_review_queue_sample", "domain_id", "review_count", "pivot"),
+                            )
+
+# Running totals for the review dashboards, kept up to date by the triggers in
+# REPORT_SUMMARY_DDL: the questions with each review count, the questions of
+# each domain with each review count and the reviews of each reviewer.  Rows
+# that drop to 0 are kept.
+ReviewCountSummary = Table("review_count_summary",
+                            Base.metadata,
+                            Column("review_count", Integer, primary_key=True),
+                            Column("questions", Integer, nullable=False),
+                            )
+
+DomainReviewSummary = Table("domain_review_summary",
+                            Base.metadata,
+                            Column("domain_id", ForeignKey("domain.id"), primary_key=True),
+                            Column("review_count", Integer, primary_key=True),
+                            Column("questions", Integer, nullable=False),
+                            )
+
+ReviewerSummary = Table("reviewer_summary",
+                            Base.metadata,
+                            Column("author_id", ForeignKey("author.id"), primary_key=True),
+                            Column("reviews", Integer, nullable=False),
                             )
 
 class Question(Base):
@@ -46,6 +95,107 @@ class Question(Base):
     author_id: Mapped[int] = mapped_column(ForeignKey("author.id"))
     author: Mapped["Author"] = relationship()
     modified: Mapped[datetime] = mapped_column(DateTime, default=func.now(), nullable=False)
+    review_count: Mapped[int] = mapped_column(server_default="0") # kept by the triggers in REVIEW_QUEUE_DDL
+
+# Full text index of the question text, answer, support and comments, kept up
+# to date by triggers on question (see the add_question_search migration).
+# It is not part of Base.metadata: create_all and autogenerate do not know
+# virtual tables, so it is created with the question table below.
+question_fts = Table("question_fts", MetaData(),
+                     Column("rowid", Integer, primary_key=True),
+                     Column("question", String),
+                     Column("correct_answer", String),
+                     Column("support", String),
+                     Column("comments", String),
+                     )
+
+QUESTION_FTS_DDL = [
+    """CREATE VIRTUAL TABLE question_fts USING fts5(
+        question, correct_answer, support, comments,
+        content='question', content_rowid='id', tokenize='porter unicode61', prefix='2 3')""",
+    """CREATE TRIGGER question_fts_insert AFTER INSERT ON question BEGIN
+        INSERT INTO question_fts(rowid, question, correct_answer, support, comments) VALUES (new.id, new.question, new.correct_answer, new.support, new.comments);
+    END""",
+    """CREATE TRIGGER question_fts_delete AFTER DELETE ON question BEGIN
+        INSERT INTO question_fts(question_fts, rowid, question, correct_answer, support, comments) VALUES ('delete', old.id, old.question, old.correct_answer, old.support, old.comments);
+    END""",
+    """CREATE TRIGGER question_fts_update AFTER UPDATE OF question, correct_answer, support, comments ON question BEGIN
+        INSERT INTO question_fts(question_fts, rowid, question, correct_answer, support, comments) VALUES ('delete', old.id, old.question, old.correct_answer, old.support, old.comments);
+        INSERT INTO question_fts(rowid, question, correct_answer, support, comments) VALUES (new.id, new.question, new.correct_answer, new.support, new.comments);
+    END""",
+]
+for statement in QUESTION_FTS_DDL:
+    event.listen(Question.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+# (table, trigger on it)
+REVIEW_QUEUE_DDL = [
+    ("review", """CREATE TRIGGER review_count_insert AFTER INSERT ON review BEGIN
+        UPDATE question SET review_count = review_count + 1 WHERE id = new.question_id;
+    END"""),
+    ("review", """CREATE TRIGGER review_count_delete AFTER DELETE ON review BEGIN
+        UPDATE question SET review_count = review_count - 1 WHERE id = old.question_id;
+    END"""),
+    ("review", """CREATE TRIGGER review_count_update AFTER UPDATE OF question_id ON review WHEN new.question_id IS NOT old.question_id BEGIN
+        UPDATE question SET review_count = review_count - 1 WHERE id = old.question_id;
+        UPDATE question SET review_count = review_count + 1 WHERE id = new.question_id;
+    END"""),
+    ("question", """CREATE TRIGGER review_queue_count AFTER UPDATE OF review_count ON question BEGIN
+        UPDATE review_queue SET review_count = new.review_count, pivot = (SELECT random()) WHERE question_id = new.id;
+    END"""),
+    ("domains_to_questions", """CREATE TRIGGER review_queue_insert AFTER INSERT ON domains_to_questions BEGIN
+        INSERT INTO review_queue(question_id, domain_id, review_count, pivot)
+        SELECT new.question_id, new.domain_id, question.review_count,
+               coalesce((SELECT pivot FROM review_queue WHERE question_id = new.question_id LIMIT 1), random())
+        FROM question WHERE question.id = new.question_id;
+    END"""),
+    ("domains_to_questions", """CREATE TRIGGER review_queue_delete AFTER DELETE ON domains_to_questions BEGIN
+        DELETE FROM review_queue WHERE question_id = old.question_id AND domain_id = old.domain_id;
+    END"""),
+    # a question deleted without first unlinking its domains leaves no rows behind
+    ("question", """CREATE TRIGGER review_queue_question_delete AFTER DELETE ON question BEGIN
+        DELETE FROM review_queue WHERE question_id = old.id;
+    END"""),
+]
+
+# (table, trigger on it)
+REPORT_SUMMARY_DDL = [
+    ("question", """CREATE TRIGGER review_count_summary_insert AFTER INSERT ON question BEGIN
+        INSERT INTO review_count_summary(review_count, questions) VALUES (new.review_count, 1)
+            ON CONFLICT(review_count) DO UPDATE SET questions = questions + 1;
+    END"""),
+    ("question", """CREATE TRIGGER review_count_summary_delete AFTER DELETE ON question BEGIN
+        UPDATE review_count_summary SET questions = questions - 1 WHERE review_count = old.review_count;
+    END"""),
+    ("question", """CREATE TRIGGER review_count_summary_update AFTER UPDATE OF review_count ON question WHEN new.review_count IS NOT old.review_count BEGIN
+        UPDATE review_count_summary SET questions = questions - 1 WHERE review_count = old.review_count;
+        INSERT INTO review_count_summary(review_count, questions) VALUES (new.review_count, 1)
+            ON CONFLICT(review_count) DO UPDATE SET questions = questions + 1;
+    END"""),
+    ("review_queue", """CREATE TRIGGER domain_review_summary_insert AFTER INSERT ON review_queue BEGIN
+        INSERT INTO domain_review_summary(domain_id, review_count, questions) VALUES (new.domain_id, new.review_count, 1)
+            ON CONFLICT(domain_id, review_count) DO UPDATE SET questions = questions + 1;
+    END"""),
+    ("review_queue", """CREATE TRIGGER domain_review_summary_delete AFTER DELETE ON review_queue BEGIN
+        UPDATE domain_review_summary SET questions = questions - 1 WHERE domain_id = old.domain_id AND review_count = old.review_count;
+    END"""),
+    ("review_queue", """CREATE TRIGGER domain_review_summary_update AFTER UPDATE OF review_count ON review_queue WHEN new.review_count IS NOT old.review_count BEGIN
+        UPDATE domain_review_summary SET questions = questions - 1 WHERE domain_id = old.domain_id AND review_count = old.review_count;
+        INSERT INTO domain_review_summary(domain_id, review_count, questions) VALUES (new.domain_id, new.review_count, 1)
+            ON CONFLICT(domain_id, review_count) DO UPDATE SET questions = questions + 1;
+    END"""),
+    ("review", """CREATE TRIGGER reviewer_summary_insert AFTER INSERT ON review WHEN new.author_id IS NOT NULL BEGIN
+        INSERT INTO reviewer_summary(author_id, reviews) VALUES (new.author_id, 1)
+            ON CONFLICT(author_id) DO UPDATE SET reviews = reviews + 1;
+    END"""),
+    ("review", """CREATE TRIGGER reviewer_summary_delete AFTER DELETE ON review WHEN old.author_id IS NOT NULL BEGIN
+        UPDATE reviewer_summary SET reviews = reviews - 1 WHERE author_id = old.author_id;
+    END"""),
+    ("review", """CREATE TRIGGER reviewer_summary_update AFTER UPDATE OF author_id ON review WHEN new.author_id IS NOT old.author_id BEGIN
+        UPDATE reviewer_summary SET reviews = reviews - 1 WHERE author_id = old.author_id;
+        INSERT INTO reviewer_summary(author_id, reviews) SELECT new.author_id, 1 WHERE new.author_id IS NOT NULL
+            ON CONFLICT(author_id) DO UPDATE SET reviews = reviews + 1;
+    END"""),
+]
 
 class Position(Base):
     __tablename__ = "position"
@@ -61,7 +211,7 @@ class Distractor(Base):
     __tablename__ = "distractor"
     id: Mapped[int] = mapped_column(primary_key=True)
     text: Mapped[str]
-    question_id: Mapped[int] = mapped_column(ForeignKey("question.id"))
+    question_id: Mapped[int] = mapped_column(ForeignKey("question.id"), index=True)
 
 class Skill(Base):
     __tablename__ = "skill"
@@ -113,6 +263,15 @@ class Review(Base):
     comments: Mapped[str] = mapped_column()
     modified: Mapped[datetime] = mapped_column(DateTime, default=func.now())
     accept: Mapped[bool] = mapped_column()
+    # a reviewer's reviews by id and their history newest first
+    __table_args__ = (
+        Index("ix_review_author_id_modified", "author_id", "modified", "question_id"),
+    )
+
+# Each trigger is created with the table it is on, so that create_all on an
+# existing database does not create it again.
+for table, statement in REVIEW_QUEUE_DDL + REPORT_SUMMARY_DDL:
+    event.listen(Base.metadata.tables[table], "after_create", DDL(statement).execute_if(dialect="sqlite"))
 
 class AiExperienceLevel(Base):
     __tablename__ = "ai_experience_level"
@@ -232,6 +391,81 @@ class ExperimentTurnFiles(Base):
 
     turn: Mapped[ExperimentTurn] = relationship()
 
+class EvalCache(Base):
+    __tablename__ = "eval_cache"
+    key: Mapped[str] = mapped_column(primary_key=True)
+    model: Mapped[str] = mapped_column()
+    is_correct: Mapped[bool] = mapped_column()
+    score: Mapped[float] = mapped_column()
+    correct_log_str: Mapped[str] = mapped_column()
+    incorrect_log_str: Mapped[str] = mapped_column() # ordered by the normalized distractor text
+    modified: Mapped[datetime] = mapped_column(DateTime, default=func.now(), nullable=False)
+
+class EvalLease(Base):
+    __tablename__ = "eval_lease"
+    key: Mapped[str] = mapped_column(primary_key=True) # eval_cache key being scored
+    owner: Mapped[str] = mapped_column()
+    expires: Mapped[float] = mapped_column() # unix time
+
+class ReviewLease(Base):
+    __tablename__ = "review_lease"
+    question_id: Mapped[int] = mapped_column(ForeignKey("question.id"), primary_key=True)
+    author_id: Mapped[int] = mapped_column(ForeignKey("author.id"), primary_key=True) # the reviewer the question was handed to
+    expires: Mapped[float] = mapped_column(index=True) # unix time
+
+class ScoringJob(Base):
+    __tablename__ = "scoring_job"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    models: Mapped[str] = mapped_column() # json list of keys of MODEL_NAME_MAP
+    validations: Mapped[int] = mapped_column()
+    status: Mapped[str] = mapped_column(server_default="pending") # pending, running, complete, failed
+    total: Mapped[int] = mapped_column(server_default="0")
+    completed: Mapped[int] = mapped_column(server_default="0")
+    checkpoint: Mapped[int] = mapped_column(server_default="0") # questions are scored in id order, every id <= checkpoint is done
+    error: Mapped[str] = mapped_column(server_default="")
+    failed: Mapped[int] = mapped_column(server_default="0") # rows in scoring_failure, retried when the job is resumed
+    created: Mapped[datetime] = mapped_column(DateTime, default=func.now(), nullable=False)
+    modified: Mapped[datetime] = mapped_column(DateTime, default=func.now(), nullable=False)
+
+class ScoringFailure(Base):
+    __tablename__ = "scoring_failure"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    job_id: Mapped[int] = mapped_column(ForeignKey("scoring_job.id"))
+    question_id: Mapped[int] = mapped_column(ForeignKey("question.id"))
+    model: Mapped[str] = mapped_column()
+    error: Mapped[str] = mapped_column()
+    modified: Mapped[datetime] = mapped_column(DateTime, default=func.now(), nullable=False)
+    __table_args__ = (
+        UniqueConstraint('job_id', 'question_id', 'model', name='ct_scoring_failure_unique'),
+    )
+
+class QuestionScore(Base):
+    __tablename__ = "question_score"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    question_id: Mapped[int] = mapped_column(ForeignKey("question.id"))
+    model: Mapped[str] = mapped_column()
+    job_id: Mapped[Optional[int]] = mapped_column(ForeignKey("scoring_job.id"))
+    is_correct: Mapped[bool] = mapped_column()
+    score: Mapped[float] = mapped_column()
+    correct_log_str: Mapped[str] = mapped_column()
+    incorrect_log_str: Mapped[str] = mapped_column()
+    modified: Mapped[datetime] = mapped_column(DateTime, default=func.now(), nullable=False)
+    __table_args__ = (
+        UniqueConstraint('question_id', 'model', name='ct_question_score_unique'),
+    )
+
+class AnswerLogprobs(Base):
+    __tablename__ = "answer_logprobs"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    question_id: Mapped[int] = mapped_column(ForeignKey("question.id"))
+    model: Mapped[str] = mapped_column()
+    answer_index: Mapped[int] = mapped_column() # 0 is the correct answer, then the distractors in the order they were scored
+    logprobs: Mapped[bytes] = mapped_column(LargeBinary) # little endian float32 per continuation token, NaN for missing
+    modified: Mapped[datetime] = mapped_column(DateTime, default=func.now(), nullable=False)
+    __table_args__ = (
+        UniqueConstraint('question_id', 'model', 'answer_index', name='ct_answer_logprobs_unique'),
+    )
+
 def get_db():
     db = SessionLocal()
     try:
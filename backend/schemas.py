@@ -8,8 +8,91 @@ class SystemStatus(str, Enum):
     ready = "ready"
     starting = "starting"
 
+class ModelState(str, Enum):
+    up = "up"
+    down = "down"
+    unknown = "unknown"
+
+class ModelStatusSchema(BaseModel):
+    name: str
+    model: str
+    state: ModelState
+    replicas_up: int
+    replicas: int
+    latency_ms: Optional[float] = None
+    checked: Optional[datetime] = None
+    error: str = ""
+
 class StatusSchema(BaseModel):
     authoring: SystemStatus
+    models: list[ModelStatusSchema] = []
+
+class ClientPoolStatsSchema(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    open_clients: int
+    class Config:
+        from_attributes = True
+
+class ScoringStatsSchema(BaseModel):
+    cancelled: int
+    disconnects: int
+    deadlines_exceeded: int
+    coalesced: int
+    lease_waits: int
+    class Config:
+        from_attributes = True
+
+class InternCacheStatsSchema(BaseModel):
+    hits: int
+    misses: int
+    reloads: int
+    class Config:
+        from_attributes = True
+
+class CassetteStatsSchema(BaseModel):
+    mode: str
+    hits: int
+    misses: int
+    recorded: int
+
+class ModelConcurrencySchema(BaseModel):
+    model: str
+    base_url: str
+    limit: float
+    in_flight: int
+    waiting: int
+    completed: int
+    backoffs: int
+    rejected: int
+
+class ReplicaSchema(BaseModel):
+    model: str
+    base_url: str
+    outstanding: int
+    requests: int
+    failures: int
+    ejections: int
+    ejected: bool
+    down: bool
+    probes: int
+    probe_failures: int
+
+class ProberStatsSchema(BaseModel):
+    rounds: int
+    errors: int
+    class Config:
+        from_attributes = True
+
+class MetricsSchema(BaseModel):
+    llm_clients: ClientPoolStatsSchema
+    scoring: ScoringStatsSchema
+    llm_limits: list[ModelConcurrencySchema]
+    llm_replicas: list[ReplicaSchema]
+    prober: ProberStatsSchema
+    interning: InternCacheStatsSchema
+    cassette: Optional[CassetteStatsSchema] = None
 
 class History(BaseModel):
     question_id: int
@@ -108,6 +191,10 @@ class QuestionSchema(BaseModel):
     comments: str = ""
     class Config:
         from_attributes = True
+class QuestionSearchResultSchema(BaseModel):
+    question: QuestionSchema
+    snippet: str
+    score: float
 class QuestionEvalSchema(BaseModel):
     model: str
     score: float
@@ -116,6 +203,33 @@ class QuestionEvalSchema(BaseModel):
     incorrectlogprobs: str
     class Config:
         from_attributes = True
+class QuestionScoreSchema(QuestionEvalSchema):
+    question_id: int
+    job_id: Optional[int]
+class RescoredQuestionSchema(BaseModel):
+    question_id: int
+    model: str
+    method: str
+    score: float
+    correct: bool
+class CreateScoringJobSchema(BaseModel):
+    models: list[str] = []
+    validations: int = 3
+class ScoringJobSchema(BaseModel):
+    id: int
+    models: list[str]
+    validations: int
+    status: str
+    total: int
+    completed: int
+    checkpoint: int
+    error: str
+    failed: int
+    created: datetime
+    modified: datetime
+class QuestionEvalErrorSchema(BaseModel):
+    model: str
+    error: str
 class ContributionsSchema(BaseModel):
     num_questions : int
     num_validated : int
@@ -0,0 +1,113 @@
+import numpy as np
+import numpy.typing as npt
+from typing import Literal, Optional, Sequence, Tuple
+
+# How the per-answer loglikelihoods are turned into logits before the softmax
+#   sum: total loglikelihood of the answer, favours short answers
+#   mean: mean loglikelihood per token
+#   token_normalized: mean loglikelihood times the average token count of the
+#       answers to the question, i.e. a sum over an answer of typical length
+ScoringMethod = Literal["sum", "mean", "token_normalized"]
+SCORING_METHODS: Tuple[ScoringMethod, ...] = ("sum", "mean", "token_normalized")
+
+def pad(rows: Sequence[Sequence[float]], fill: float = np.nan) -> npt.NDArray[np.float64]:
+    """
+    Stack ragged rows (questions with different numbers of distractors) into a matrix padded with fill.
+    """
+    width = max((len(r) for r in rows), default=0)
+    out = np.full((len(rows), width), fill, dtype=np.float64)
+    for i, r in enumerate(rows):
+        out[i, :len(r)] = r
+    return out
+
+def answer_logits(mean_loglikelihoods: npt.ArrayLike, token_counts: npt.ArrayLike, method: ScoringMethod = "token_normalized") -> npt.NDArray[np.float64]:
+    """
+    Return the logit of every answer.
+
+    Both arguments are (questions, answers) matrices with the correct answer in
+    column 0 and NaN marking missing answers.
+    """
+    means = np.asarray(mean_loglikelihoods, dtype=np.float64)
+    counts = np.asarray(token_counts, dtype=np.float64)
+    if method == "sum":
+        return means * counts
+    elif method == "mean":
+        return means
+    elif method == "token_normalized":
+        avg_token_count = np.nanmean(counts, axis=1, keepdims=True)
+        return means * avg_token_count
+    raise ValueError(f"unknown scoring method {method}")
+
+def logsumexp(x: npt.NDArray[np.float64], axis: int = -1) -> npt.NDArray[np.float64]:
+    """
+    log(sum(exp(x))) along axis ignoring NaN, without overflow or underflow.
+    """
+    peak = np.nanmax(x, axis=axis, keepdims=True)
+    peak = np.where(np.isfinite(peak), peak, 0.0)
+    total = np.nansum(np.exp(x - peak), axis=axis, keepdims=True)
+    with np.errstate(divide="ignore"):
+        return np.squeeze(np.log(total) + peak, axis=axis)
+
+def score_batch(mean_loglikelihoods: npt.ArrayLike, token_counts: npt.ArrayLike, method: ScoringMethod = "token_normalized") -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+    """
+    Score a batch of questions in one vectorized pass.
+
+    Returns the probability the model assigns to the correct answer (column 0)
+    among all the answers of each question, and whether the correct answer has
+    a strictly higher logit than every distractor.
+    """
+    logits = answer_logits(mean_loglikelihoods, token_counts, method)
+    scores = np.exp(logits[:, 0] - logsumexp(logits, axis=1))
+    best_distractor = np.max(np.where(np.isnan(logits[:, 1:]), -np.inf, logits[:, 1:]), axis=1, initial=-np.inf)
+    is_correct = logits[:, 0] > best_distractor
+    return scores, is_correct
+
+def pack_logprobs(token_logprobs: Sequence[Optional[float]]) -> bytes:
+    """
+    Encode the token logprobs of an answer as little endian float32, with NaN for missing logprobs.
+    """
+    return np.array([np.nan if lp is None else lp for lp in token_logprobs], dtype="<f4").tobytes()
+
+def unpack_logprobs(blob: bytes) -> npt.NDArray[np.float32]:
+    return np.frombuffer(blob, dtype="<f4")
+
+def reduce_logprobs(blobs: Sequence[bytes]) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+    """
+    Return the mean loglikelihood and token count of every packed answer.
+
+    The blobs are decoded as one buffer and reduced per answer with
+    np.add.reduceat, so no Python work is done per token.
+    """
+    counts = np.fromiter((len(b) // 4 for b in blobs), dtype=np.int64, count=len(blobs))
+    values = np.frombuffer(b"".join(blobs), dtype="<f4").astype(np.float64)
+    present = ~np.isnan(values)
+    sums = np.zeros(len(blobs))
+    present_counts = np.zeros(len(blobs))
+    nonempty = counts > 0
+    if values.size:
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        sums[nonempty] = np.add.reduceat(np.where(present, values, 0.0), starts)
+        present_counts[nonempty] = np.add.reduceat(present.astype(np.float64), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / present_counts, counts
+
+def rescore(question_ids: Sequence[int], answer_indexes: Sequence[int], blobs: Sequence[bytes], method: ScoringMethod = "token_normalized") -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+    """
+    Score questions from stored token logprobs, one row per (question, answer).
+
+    Returns the question ids with their scores and correctness; questions
+    without a stored correct answer are left out.
+    """
+    means, counts = reduce_logprobs(blobs)
+    ids, rows = np.unique(np.asarray(question_ids, dtype=np.int64), return_inverse=True)
+    columns = np.asarray(answer_indexes, dtype=np.int64)
+    width = int(columns.max()) + 1 if columns.size else 0
+    mean_matrix = np.full((len(ids), width), np.nan)
+    count_matrix = np.full((len(ids), width), np.nan)
+    mean_matrix[rows, columns] = means
+    count_matrix[rows, columns] = counts
+    if width == 0:
+        return ids, np.zeros(0), np.zeros(0, dtype=bool)
+    complete = ~np.isnan(mean_matrix[:, 0])
+    scores, is_correct = score_batch(mean_matrix[complete], count_matrix[complete], method)
+    return ids[complete], scores, is_correct